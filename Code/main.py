@@ -1,14 +1,28 @@
 import sys
 import os
+import posixpath
+import io
+import re
+import socket
+import hashlib
+import zlib
 import logging
 from datetime import datetime
 import time
+import calendar
+import random
+import heapq
+import itertools
+import weakref
+import asyncio
 from PyQt5 import QtWidgets, QtGui, QtCore
 import sqlite3
 import ftplib
-from collections import deque
+import threading
+from collections import deque, OrderedDict
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import (FileSystemEventHandler, FileCreatedEvent, FileDeletedEvent, FileModifiedEvent, FileMovedEvent,
+                             DirCreatedEvent, DirDeletedEvent, DirMovedEvent)
 from PyQt5.QtWidgets import QDialog, QLabel, QMessageBox, QVBoxLayout, QHBoxLayout, QPushButton, QProgressBar, QWidget
 from PyQt5.QtWebEngineWidgets import QWebEngineView
 from PyQt5.QtCore import QTimer, QUrl, Qt
@@ -19,11 +33,1906 @@ master_db_file = "C:\\TSTP\\FTPManager\\DB\\ftp.db"
 program_save_folder = "C:\\TSTP\\OmniOmega\\Logs\\FTP\\"
 notification_db = "C:\\TSTP\\FTPManager\\DB\\notification_filters.db"
 
+# Number of parallel upload connections used per monitored folder unless the quick connect overrides it
+default_upload_connections = 4
+# Connection pool limits: open connections per host, seconds before an idle connection is closed,
+# and seconds of inactivity after which an idle connection is probed with NOOP to keep it warm
+max_connections_per_host = 8
+idle_connection_timeout = 300
+connection_keepalive_interval = 30
+# Uploads of at least this many bytes record a resume point, which is refreshed every checkpoint interval
+resume_min_size = 1024 * 1024
+resume_checkpoint_bytes = 64 * 1024 * 1024
+# Files of at least this size are split into ranges and uploaded concurrently when the quick connect enables segmented uploads
+segmented_upload_threshold = 256 * 1024 * 1024
+# Remote files of at least this size are fetched as concurrent REST+RETR ranges when the quick connect enables segmented transfers
+segmented_download_threshold = 256 * 1024 * 1024
+# Quick connects with atomic uploads write to ".<name><suffix>" next to the target and rename it into place once verified
+atomic_upload_suffix = '.ftpmanager-upload'
+# Background threads shared by GUI-initiated transfers, connects and listings
+transfer_executor_workers = 4
+# Upload threads shared by every monitored folder, each folder still sends at most its connection count at once,
+# and a thread left without work for the idle timeout exits so idle folders cost no threads
+upload_pool_workers = 32
+upload_worker_idle_timeout = 60.0
+# Upload retry policies per error class: (first delay in seconds, longest delay, attempts before giving up)
+upload_retry_policies = {
+    'connection': (2, 300, 10),
+    'temporary': (5, 120, 6),
+    'verification': (5, 60, 3),
+    'permanent': (5, 5, 2),
+    'local': (0, 0, 1),
+}
+# Bytes handed to the kernel per sendfile call, progress callbacks fire once per chunk
+sendfile_chunk_size = 8 * 1024 * 1024
+# Seconds between remote scans when a quick connect mirrors the server into the local folder (sync_direction 'download')
+mirror_interval = 300
+# The transfer journal commits every record made within this many seconds in one transaction, or sooner once a batch is this large
+journal_commit_interval = 0.05
+journal_batch_size = 1000
+# Seconds a written file's size and mtime must stay unchanged before it is uploaded, 0 uploads on the first event
+write_settle_interval = 2.0
+# Content hash the local file index keeps to tell real changes from files that were only touched
+file_index_algorithm = 'sha256'
+# A folder modified this close to when its summary was taken may change again within the same mtime tick, it is always rescanned
+directory_mtime_granularity = 2.0
+# Seconds the remote copy of a deleted file is kept so a new file with the same content can be renamed onto instead of uploaded
+move_detection_window = 10.0
+deleted_folder_suffix = '.ftpmanager-deleted'
+# Polling watch mode for network shares: the pause between scans adapts between these bounds, every folder is listed
+# in full at least every sweep interval, which doubles towards the maximum while sweeps find nothing, and files that
+# changed are re-checked on every scan for a while
+polling_min_interval = 1.0
+polling_max_interval = 30.0
+polling_full_sweep_interval = 60.0
+polling_max_full_sweep_interval = 1800.0
+polling_hot_file_window = 60.0
+# File events are folded into their net effect until none arrived for the window, or the oldest is this many seconds old
+event_coalesce_window = 0.5
+event_coalesce_max_delay = 5.0
+
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
     base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
     return os.path.join(base_path, relative_path)
 
+class FTPManagerConnectionLease:
+    """ Exclusive use of one pooled FTP connection until released """
+
+    def __init__(self, pool, host, username, password, ftp):
+        self.pool = pool
+        self.host = host
+        self.username = username
+        self.password = password
+        self.ftp = ftp
+        self.returned = False
+
+    def release(self):
+        if not self.returned:
+            self.returned = True
+            self.pool.release(self)
+
+    def discard(self):
+        if not self.returned:
+            self.returned = True
+            self.pool.discard(self)
+
+    def reconnect(self):
+        return self.pool.reconnect(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and isinstance(exc_value, ftplib.all_errors):
+            self.discard()
+        else:
+            self.release()
+        return False
+
+class FTPManagerConnectionPool:
+    """ Process-wide pool of logged in FTP connections keyed by (host, username) """
+
+    def __init__(self, max_per_host=max_connections_per_host, idle_timeout=idle_connection_timeout, keepalive_interval=connection_keepalive_interval):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.condition = threading.Condition()
+        self.idle = {}  # (host, username) -> list of (ftp, last_used, last_checked)
+        self.open_counts = {}  # host -> connections open (idle and leased)
+        self.keepalive_thread = None
+
+    def open_connection(self, host, username, password):
+        ftp = ftplib.FTP(host, timeout=30)
+        try:
+            ftp.login(username, password)
+        except:
+            self.close_connection(ftp)
+            raise
+        return ftp
+
+    def close_connection(self, ftp):
+        try:
+            ftp.quit()
+        except:
+            try:
+                ftp.close()
+            except:
+                pass
+
+    def close_connections(self, connections):
+        # Never called with the lock held, QUIT to a slow server would stall every host's acquire
+        for ftp in connections:
+            self.close_connection(ftp)
+
+    def acquire(self, host, username, password, timeout=120):
+        key = (host, username)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            ftp = None
+            last_checked = 0
+            evicted = []
+            try:
+                with self.condition:
+                    self.start_keepalive()
+                    while True:
+                        idle = self.idle.get(key)
+                        if idle:
+                            ftp, _, last_checked = idle.pop()
+                            break
+                        if self.open_counts.get(host, 0) < self.max_per_host:
+                            self.open_counts[host] = self.open_counts.get(host, 0) + 1
+                            break
+                        if self.evict_idle(host, evicted):
+                            continue
+                        remaining = deadline - time.monotonic() if deadline is not None else None
+                        if remaining is not None and remaining <= 0:
+                            raise ConnectionError(f"No FTP connection to {host} became available within {timeout} seconds")
+                        self.condition.wait(remaining)
+            finally:
+                self.close_connections(evicted)
+
+            if ftp is None:
+                try:
+                    ftp = self.open_connection(host, username, password)
+                except:
+                    self.forget_slot(host)
+                    raise
+                return FTPManagerConnectionLease(self, host, username, password, ftp)
+
+            if time.monotonic() - last_checked < self.keepalive_interval:
+                return FTPManagerConnectionLease(self, host, username, password, ftp)
+            try:
+                ftp.voidcmd("NOOP")
+                return FTPManagerConnectionLease(self, host, username, password, ftp)
+            except ftplib.all_errors:
+                # The server dropped the idle connection, free its slot and try again
+                self.close_connection(ftp)
+                self.forget_slot(host)
+
+    def acquire_spare(self, host, username, password, count):
+        """ Up to count more leases on host, only as many as are free right now, for work that can make do with fewer """
+        leases = []
+        for _ in range(count):
+            try:
+                leases.append(self.acquire(host, username, password, timeout=0))
+            except ftplib.all_errors:
+                break
+        return leases
+
+    def reserve_slot(self, host):
+        """ Count a connection opened outside the pool against host's limit, False when no slot is free right now """
+        evicted = []
+        with self.condition:
+            while self.open_counts.get(host, 0) >= self.max_per_host and self.evict_idle(host, evicted):
+                pass
+            reserved = self.open_counts.get(host, 0) < self.max_per_host
+            if reserved:
+                self.open_counts[host] = self.open_counts.get(host, 0) + 1
+        self.close_connections(evicted)
+        return reserved
+
+    def evict_idle(self, host, evicted):
+        # Called with the lock held: take an idle connection another user holds on the same host out of the pool,
+        # the caller closes what lands in evicted once the lock is released
+        for (idle_host, idle_username), idle in self.idle.items():
+            if idle_host == host and idle:
+                ftp, _, _ = idle.pop(0)
+                evicted.append(ftp)
+                self.open_counts[host] -= 1
+                return True
+        return False
+
+    def forget_slot(self, host):
+        with self.condition:
+            self.open_counts[host] = max(0, self.open_counts.get(host, 0) - 1)
+            self.condition.notify_all()
+
+    def release(self, lease):
+        ftp, lease.ftp = lease.ftp, None
+        if ftp is None or ftp.sock is None:
+            self.forget_slot(lease.host)
+            return
+        now = time.monotonic()
+        with self.condition:
+            self.idle.setdefault((lease.host, lease.username), []).append((ftp, now, now))
+            self.condition.notify_all()
+
+    def discard(self, lease):
+        ftp, lease.ftp = lease.ftp, None
+        if ftp is not None:
+            self.close_connection(ftp)
+        self.forget_slot(lease.host)
+
+    def reconnect(self, lease):
+        # Replace a broken connection without giving up the lease's slot
+        if lease.ftp is not None:
+            self.close_connection(lease.ftp)
+        lease.ftp = None
+        lease.ftp = self.open_connection(lease.host, lease.username, lease.password)
+        return lease.ftp
+
+    def close_idle(self, host=None, username=None):
+        closing = []
+        with self.condition:
+            for (idle_host, idle_username), idle in self.idle.items():
+                if (host is None or idle_host == host) and (username is None or idle_username == username):
+                    while idle:
+                        ftp, _, _ = idle.pop()
+                        closing.append(ftp)
+                        self.open_counts[idle_host] -= 1
+            self.condition.notify_all()
+        self.close_connections(closing)
+
+    def start_keepalive(self):
+        # Called with the lock held
+        if self.keepalive_thread is None:
+            self.keepalive_thread = threading.Thread(target=self.keepalive_loop, name="FTPConnectionKeepalive", daemon=True)
+            self.keepalive_thread.start()
+
+    def keepalive_loop(self):
+        while True:
+            time.sleep(self.keepalive_interval)
+            now = time.monotonic()
+            expired = []
+            stale = []
+            with self.condition:
+                for key, idle in self.idle.items():
+                    keep = []
+                    for ftp, last_used, last_checked in idle:
+                        if now - last_used >= self.idle_timeout:
+                            expired.append((key, ftp))
+                        elif now - last_checked >= self.keepalive_interval:
+                            stale.append((key, ftp, last_used))
+                        else:
+                            keep.append((ftp, last_used, last_checked))
+                    idle[:] = keep
+            for key, ftp in expired:
+                self.close_connection(ftp)
+                self.forget_slot(key[0])
+            for key, ftp, last_used in stale:
+                try:
+                    ftp.voidcmd("NOOP")
+                except ftplib.all_errors:
+                    self.close_connection(ftp)
+                    self.forget_slot(key[0])
+                    continue
+                with self.condition:
+                    # Keep the last use time so the connection still expires after idle_timeout
+                    self.idle.setdefault(key, []).append((ftp, last_used, time.monotonic()))
+                    self.condition.notify_all()
+
+ftp_connection_pool = FTPManagerConnectionPool()
+
+class FTPManagerTransferTuner:
+    """ Learns RTT and throughput per host and derives block and socket buffer sizes for later transfers """
+
+    min_buffer = 64 * 1024
+    max_buffer = 16 * 1024 * 1024
+    min_blocksize = 8192
+    max_blocksize = 1024 * 1024
+    min_sample_bytes = 1024 * 1024  # Smaller transfers say more about latency than bandwidth
+    smoothing = 0.3
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = {}  # host -> {'rtt', 'throughput', 'blocksize', 'sndbuf'}
+
+    def state(self, host):
+        # Called with the lock held
+        return self.hosts.setdefault(host, {'rtt': None, 'throughput': None, 'blocksize': None, 'sndbuf': None})
+
+    def seed(self, host, blocksize, sndbuf):
+        with self.lock:
+            state = self.state(host)
+            if blocksize and not state['blocksize']:
+                state['blocksize'] = blocksize
+            if sndbuf and not state['sndbuf']:
+                state['sndbuf'] = sndbuf
+
+    def get(self, host, default_blocksize):
+        with self.lock:
+            state = self.hosts.get(host)
+            if not state:
+                return default_blocksize, None
+            return state['blocksize'] or default_blocksize, state['sndbuf']
+
+    def smooth(self, previous, sample):
+        return sample if previous is None else previous + self.smoothing * (sample - previous)
+
+    def record_rtt(self, host, seconds):
+        with self.lock:
+            state = self.state(host)
+            state['rtt'] = self.smooth(state['rtt'], seconds)
+
+    def record_transfer(self, host, nbytes, seconds):
+        if nbytes < self.min_sample_bytes or seconds <= 0:
+            return
+        with self.lock:
+            state = self.state(host)
+            state['throughput'] = self.smooth(state['throughput'], nbytes / seconds)
+            self.retune(state)
+
+    def retune(self, state):
+        # Aim the send buffer at twice the bandwidth-delay product, and keep doubling it while
+        # the achieved rate sits at the ceiling the current buffer allows (window limited)
+        rtt = max(state['rtt'] or 0.001, 0.0001)
+        throughput = state['throughput']
+        target = 2 * throughput * rtt
+        sndbuf = state['sndbuf']
+        if sndbuf and throughput >= 0.8 * sndbuf / rtt:
+            target = max(target, sndbuf * 2)
+        sndbuf = int(min(max(target, self.min_buffer), self.max_buffer))
+        blocksize = self.min_blocksize
+        while blocksize * 2 <= min(sndbuf // 4, self.max_blocksize):
+            blocksize *= 2
+        state['sndbuf'] = sndbuf
+        state['blocksize'] = blocksize
+
+    def save(self, host, quick_connect_id, log_func):
+        """ Persist what was learned for host so the next session of the quick connect starts there """
+        if quick_connect_id is None:
+            return
+        blocksize, sndbuf = self.get(host, 0)
+        if not blocksize and not sndbuf:
+            return
+        try:
+            conn = sqlite3.connect(master_db_file)
+            c = conn.cursor()
+            c.execute('UPDATE quick_connects SET tuned_blocksize=?, tuned_sndbuf=? WHERE id=?', (blocksize, sndbuf or 0, quick_connect_id))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            log_func(f"Failed to save transfer tuning: {e}")
+
+transfer_tuner = FTPManagerTransferTuner()
+
+class FTPManagerBandwidthSchedule:
+    """ Rate by time of day, e.g. "08:00-18:00=2M; *=0" (bytes per second, K/M/G suffixes, 0 is unlimited) """
+
+    def __init__(self, text):
+        self.text = text
+        self.windows = []  # (start minute, end minute, rate)
+        self.default_rate = 0
+        for entry in text.replace(',', ';').split(';'):
+            entry = entry.strip()
+            if not entry:
+                continue
+            window, _, rate = entry.partition('=')
+            rate = self.parse_rate(rate)
+            window = window.strip()
+            if window == '*':
+                self.default_rate = rate
+                continue
+            start, _, end = window.partition('-')
+            self.windows.append((self.parse_time(start), self.parse_time(end), rate))
+
+    @staticmethod
+    def parse_rate(text):
+        text = text.strip().upper().rstrip('/S').rstrip('B').strip()
+        if text in ('', 'UNLIMITED', 'OFF'):
+            return 0
+        multiplier = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}.get(text[-1], 1)
+        number = text[:-1] if text[-1] in 'KMG' else text
+        return int(float(number) * multiplier)
+
+    @staticmethod
+    def parse_time(text):
+        hours, _, minutes = text.strip().partition(':')
+        return int(hours) * 60 + int(minutes or 0)
+
+    def rate_at(self, moment):
+        minute = moment.hour * 60 + moment.minute
+        for start, end, rate in self.windows:
+            # Windows that pass midnight, e.g. 22:00-06:00, wrap around
+            if (start <= minute < end) if start <= end else (minute >= start or minute < end):
+                return rate
+        return self.default_rate
+
+class FTPManagerTokenBucket:
+    """ Token bucket whose fill rate follows a schedule, allowing at most one second of burst """
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.lock = threading.Lock()
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+    def rate(self):
+        return self.schedule.rate_at(datetime.now())
+
+    def reserve(self, nbytes):
+        # Take the tokens now, possibly going into debt, and return how long the caller must wait
+        rate = self.rate()
+        with self.lock:
+            now = time.monotonic()
+            if not rate:
+                self.tokens = 0.0
+                self.updated = now
+                return 0
+            self.tokens = min(self.tokens + (now - self.updated) * rate, rate)
+            self.updated = now
+            self.tokens -= nbytes
+            return -self.tokens / rate if self.tokens < 0 else 0
+
+class FTPManagerThrottle:
+    """ The buckets one transfer has to pass: global, its host and its session """
+
+    def __init__(self, limiter, host, session_id=None):
+        self.limiter = limiter
+        self.host = host
+        self.session_id = session_id
+        self.generation = None
+        self.active_buckets = []
+
+    def buckets(self):
+        # Looked up again whenever the limits were reloaded, so running monitors and mirrors follow a saved change
+        if self.generation != self.limiter.generation:
+            self.generation, self.active_buckets = self.limiter.buckets(self.host, self.session_id)
+        return self.active_buckets
+
+    def consume(self, nbytes):
+        delay = self.delay(nbytes)
+        if delay > 0:
+            time.sleep(delay)
+
+    def delay(self, nbytes):
+        # Seconds to wait after sending nbytes, asyncio callers sleep on the event loop instead of blocking
+        buckets = self.buckets()
+        return max(bucket.reserve(nbytes) for bucket in buckets) if buckets else 0
+
+    def chunk_size(self, preferred):
+        # Keep chunks to about an eighth of a second at the lowest active rate so pacing stays smooth
+        rates = [rate for rate in (bucket.rate() for bucket in self.buckets()) if rate]
+        if not rates:
+            return preferred
+        return max(16 * 1024, min(preferred, min(rates) // 8))
+
+class FTPManagerBandwidthLimiter:
+    """ Bandwidth limits configured in the bandwidth_limits table, by scope 'global', 'host' or 'session' """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.generation = 0  # Bumped by every reload
+        self.global_bucket = None
+        self.host_buckets = {}
+        self.session_buckets = {}  # Quick connect id (as text) -> bucket
+
+    def reload(self):
+        global_bucket = None
+        host_buckets = {}
+        session_buckets = {}
+        try:
+            conn = sqlite3.connect(master_db_file)
+            c = conn.cursor()
+            c.execute('SELECT scope, target, schedule FROM bandwidth_limits')
+            rows = c.fetchall()
+            conn.close()
+        except sqlite3.Error as e:
+            if debug_mode:
+                print(f"SQLite error: {e.args[0]} while loading bandwidth limits")
+            rows = []
+        for scope, target, schedule_text in rows:
+            try:
+                bucket = FTPManagerTokenBucket(FTPManagerBandwidthSchedule(schedule_text))
+            except ValueError:
+                if debug_mode:
+                    print(f"Ignoring invalid bandwidth schedule: {schedule_text}")
+                continue
+            if scope == 'global':
+                global_bucket = bucket
+            elif scope == 'host':
+                host_buckets[target] = bucket
+            elif scope == 'session':
+                session_buckets[str(target)] = bucket
+        with self.lock:
+            self.global_bucket = global_bucket
+            self.host_buckets = host_buckets
+            self.session_buckets = session_buckets
+            self.generation += 1
+            self.loaded = True
+
+    def buckets(self, host, session_id=None):
+        """ (generation, buckets) currently configured for a transfer to host in the given session """
+        if not self.loaded:
+            self.reload()
+        with self.lock:
+            buckets = [
+                self.global_bucket,
+                self.host_buckets.get(host),
+                self.session_buckets.get(str(session_id)) if session_id is not None else None,
+            ]
+            return self.generation, [bucket for bucket in buckets if bucket is not None]
+
+    def throttle(self, host, session_id=None):
+        return FTPManagerThrottle(self, host, session_id)
+
+bandwidth_limiter = FTPManagerBandwidthLimiter()
+
+class FTPManagerUploadEngine:
+    """ Sends files over FTP data connections it opens itself, using sendfile so the kernel moves the bytes """
+
+    def __init__(self, blocksize=8192, use_sendfile=True):
+        self.blocksize = blocksize
+        self.use_sendfile = use_sendfile
+
+    def can_sendfile(self, ftp):
+        # TLS data connections have to pass through the SSL layer in user space
+        return self.use_sendfile and not isinstance(ftp, ftplib.FTP_TLS) and hasattr(socket.socket, 'sendfile')
+
+    def store(self, ftp, cmd, file, rest=None, callback=None, throttle=None, hasher=None, stop_event=None):
+        """ Drop-in for ftplib.storbinary, callback receives the number of bytes sent per chunk """
+        conn = self.open_data_connection(ftp, cmd, rest)
+        start = time.perf_counter()
+        try:
+            sent = self.send(ftp, conn, file, None, callback, throttle, hasher, stop_event)
+            self.close_data_connection(conn)
+        finally:
+            conn.close()
+        response = ftp.voidresp()
+        transfer_tuner.record_transfer(ftp.host, sent, time.perf_counter() - start)
+        return response
+
+    def open_data_connection(self, ftp, cmd, rest=None):
+        # TYPE I is sent before every transfer anyway, its round trip doubles as the RTT sample
+        start = time.perf_counter()
+        ftp.voidcmd('TYPE I')
+        transfer_tuner.record_rtt(ftp.host, time.perf_counter() - start)
+        conn = ftp.transfercmd(cmd, rest)
+        _, sndbuf = transfer_tuner.get(ftp.host, self.blocksize)
+        if sndbuf:
+            try:
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+            except OSError:
+                pass
+        return conn
+
+    def send(self, ftp, conn, file, length=None, callback=None, throttle=None, hasher=None, stop_event=None):
+        # Send length bytes (or up to EOF) from the file's current position, a hasher needs
+        # to see the bytes and therefore takes the buffered path
+        if throttle is None:
+            throttle = bandwidth_limiter.throttle(ftp.host)
+        if hasher is None and self.can_sendfile(ftp):
+            return self.send_with_sendfile(conn, file, length, callback, throttle, stop_event)
+        blocksize, _ = transfer_tuner.get(ftp.host, self.blocksize)
+        return self.send_buffered(conn, file, length, callback, blocksize, throttle, hasher, stop_event)
+
+    @staticmethod
+    def check_stopped(stop_event, file):
+        # Checked per chunk so stopping a monitor does not wait for a large file to finish
+        if stop_event is not None and stop_event.is_set():
+            raise FTPManagerTransferStopped(f"Stopped while uploading {getattr(file, 'name', 'a file')}")
+
+    def send_with_sendfile(self, conn, file, length, callback, throttle, stop_event=None):
+        offset = file.tell()
+        total = 0
+        while length is None or total < length:
+            self.check_stopped(stop_event, file)
+            chunk_size = throttle.chunk_size(sendfile_chunk_size)
+            count = chunk_size if length is None else min(chunk_size, length - total)
+            sent = conn.sendfile(file, offset + total, count)
+            if sent == 0:
+                break
+            total += sent
+            throttle.consume(sent)
+            if callback:
+                callback(sent)
+        if length is not None and total < length:
+            raise EOFError(f"Local file ended {length - total} bytes before the end of the range")
+        return total
+
+    def send_buffered(self, conn, file, length, callback, blocksize, throttle, hasher=None, stop_event=None):
+        total = 0
+        while length is None or total < length:
+            self.check_stopped(stop_event, file)
+            chunk_size = throttle.chunk_size(blocksize)
+            buf = file.read(chunk_size if length is None else min(chunk_size, length - total))
+            if not buf:
+                break
+            if hasher is not None:
+                hasher.update(buf)
+            conn.sendall(buf)
+            total += len(buf)
+            throttle.consume(len(buf))
+            if callback:
+                callback(len(buf))
+        if length is not None and total < length:
+            raise EOFError(f"Local file ended {length - total} bytes before the end of the range")
+        return total
+
+    def close_data_connection(self, conn):
+        if hasattr(conn, 'unwrap'):
+            conn.unwrap()
+        conn.close()
+
+    def benchmark(self, ftp, local_path, remote_path, rounds=3):
+        """ Upload the same file with ftplib.storbinary and with this engine, returning MB/s for each """
+        size = os.path.getsize(local_path)
+        results = {}
+        for name in ('storbinary', 'sendfile'):
+            best = 0.0
+            for _ in range(rounds):
+                with open(local_path, 'rb') as file:
+                    start = time.perf_counter()
+                    if name == 'storbinary':
+                        ftp.storbinary(f'STOR {remote_path}', file, blocksize=self.blocksize)
+                    else:
+                        self.store(ftp, f'STOR {remote_path}', file)
+                    elapsed = time.perf_counter() - start
+                best = max(best, size / elapsed / (1024 * 1024))
+            results[name] = best
+        try:
+            ftp.delete(remote_path)
+        except ftplib.all_errors:
+            pass
+        return results
+
+upload_engine = FTPManagerUploadEngine()
+
+def run_upload_benchmark(args):
+    """ python main.py --benchmark-upload HOST USERNAME PASSWORD LOCAL_FILE [REMOTE_FOLDER] """
+    if len(args) < 4:
+        print(run_upload_benchmark.__doc__.strip())
+        return 2
+    host, username, password, local_path = args[:4]
+    remote_folder = args[4] if len(args) > 4 else ''
+    remote_path = f"{remote_folder.rstrip('/')}/.ftpmanager_benchmark" if remote_folder else '.ftpmanager_benchmark'
+    ftp = ftplib.FTP(host, timeout=30)
+    ftp.login(username, password)
+    try:
+        results = upload_engine.benchmark(ftp, local_path, remote_path)
+    finally:
+        ftp.quit()
+    size_mb = os.path.getsize(local_path) / (1024 * 1024)
+    print(f"Uploaded {size_mb:.1f} MB to {host}, best of 3 rounds:")
+    for name, throughput in results.items():
+        print(f"  {name:<10} {throughput:10.1f} MB/s")
+    if results['storbinary']:
+        print(f"  sendfile speedup: {results['sendfile'] / results['storbinary']:.2f}x")
+    return 0
+
+class FTPManagerCRC32:
+    """ hashlib-style wrapper around zlib.crc32 for XCRC and HASH CRC32 """
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return f'{self.value:08x}'
+
+class FTPManagerChecksumVerifier:
+    """ Picks a checksum command the server advertises in FEAT and compares its answer with a hash computed while uploading """
+
+    # Preference order, as (HASH algorithm name, local algorithm) and (command, local algorithm)
+    hash_algorithms = [('SHA-256', 'sha256'), ('SHA-1', 'sha1'), ('MD5', 'md5'), ('CRC32', 'crc32')]
+    legacy_commands = [('XSHA256', 'sha256'), ('XSHA1', 'sha1'), ('XMD5', 'md5'), ('XCRC', 'crc32')]
+    digest_lengths = {'sha256': 64, 'sha1': 40, 'md5': 32, 'crc32': 8}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = {}  # host -> (command, algorithm) or None
+        self.selected = weakref.WeakKeyDictionary()  # Connection -> algorithm chosen on it with OPTS HASH
+
+    def method(self, ftp):
+        with self.lock:
+            if ftp.host in self.methods:
+                return self.methods[ftp.host]
+        method = self.detect(ftp)
+        with self.lock:
+            self.methods[ftp.host] = method
+        return method
+
+    def disable(self, host):
+        with self.lock:
+            self.methods[host] = None
+
+    def detect(self, ftp):
+        try:
+            features = [line.strip() for line in ftp.sendcmd('FEAT').splitlines()[1:-1]]
+        except ftplib.error_perm:
+            return None
+        commands = {feature.split(' ', 1)[0].upper(): feature for feature in features}
+        if 'HASH' in commands:
+            # e.g. "HASH SHA-256*;SHA-1;MD5", the starred algorithm is the one currently selected
+            offered = {name.strip().rstrip('*').upper(): name.strip().endswith('*') for name in commands['HASH'][4:].split(';') if name.strip()}
+            for name, algorithm in self.hash_algorithms:
+                if name not in offered:
+                    continue
+                try:
+                    self.select_hash(ftp, algorithm)
+                    return ('HASH', algorithm)
+                except ftplib.error_perm:
+                    break
+        for command, algorithm in self.legacy_commands:
+            if command in commands:
+                return (command, algorithm)
+        return None
+
+    def select_hash(self, ftp, algorithm):
+        # OPTS HASH only applies to the connection it was sent on, pooled and reconnected ones start at the server's default
+        with self.lock:
+            if self.selected.get(ftp) == algorithm:
+                return
+        name = next(name for name, local in self.hash_algorithms if local == algorithm)
+        ftp.sendcmd(f'OPTS HASH {name}')
+        with self.lock:
+            self.selected[ftp] = algorithm
+
+    def new_hasher(self, method):
+        algorithm = method[1]
+        return FTPManagerCRC32() if algorithm == 'crc32' else hashlib.new(algorithm)
+
+    def remote_digest(self, ftp, remote_path, method):
+        command, algorithm = method
+        if command == 'HASH':
+            self.select_hash(ftp, algorithm)
+        response = ftp.sendcmd(f'{command} {remote_path}')
+        # Replies differ between servers ("213 SHA-256 0-99 <hex> name", "250 <hex>", ...), take the
+        # first token that looks like a digest of the expected length
+        length = self.digest_lengths[algorithm]
+        for token in response[4:].split():
+            if re.fullmatch(r'[0-9A-Fa-f]+', token) and (len(token) == length or (algorithm == 'crc32' and len(token) < length)):
+                return token
+        raise ftplib.error_reply(f"Unrecognised {command} reply: {response}")
+
+    def verify(self, ftp, remote_path, method, local_digest):
+        return int(self.remote_digest(ftp, remote_path, method), 16) == int(local_digest, 16)
+
+upload_checksums = FTPManagerChecksumVerifier()
+
+class FTPManagerTransferStopped(Exception):
+    """ The mirror or monitor was stopped in the middle of a transfer """
+
+class FTPManagerDownloadEngine:
+    """ Fetches remote files into a temporary sibling and renames them into place once complete """
+
+    part_suffix = '.ftpmanager-part'
+
+    def retrieve(self, ftp, remote_path, local_path, remote_mtime=None, throttle=None, stop_event=None):
+        if throttle is None:
+            throttle = bandwidth_limiter.throttle(ftp.host)
+        local_dir = os.path.dirname(local_path)
+        if local_dir:
+            os.makedirs(local_dir, exist_ok=True)
+        part_path = local_path + self.part_suffix
+        blocksize, _ = transfer_tuner.get(ftp.host, upload_engine.blocksize)
+        received = [0]
+        start = time.perf_counter()
+        try:
+            with open(part_path, 'wb') as file:
+                def write(block):
+                    # Checked per block so stopping the mirror does not wait for a large file to finish
+                    if stop_event is not None and stop_event.is_set():
+                        raise FTPManagerTransferStopped(f"Stopped while downloading {remote_path}")
+                    file.write(block)
+                    received[0] += len(block)
+                    throttle.consume(len(block))
+                ftp.retrbinary(f'RETR {remote_path}', write, blocksize=blocksize)
+            if remote_mtime is not None:
+                # Carry the server's timestamp over so the next scan sees the file as unchanged
+                os.utime(part_path, (remote_mtime, remote_mtime))
+            os.replace(part_path, local_path)
+        except BaseException:
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+            raise
+        transfer_tuner.record_transfer(ftp.host, received[0], time.perf_counter() - start)
+        return received[0]
+
+download_engine = FTPManagerDownloadEngine()
+
+class FTPManagerSegmentedDownloader:
+    """ Downloads one large file as concurrent REST+RETR ranges written straight into a preallocated local file """
+
+    def __init__(self, host, username, password, throttle=None, stop_event=None):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.throttle = throttle if throttle is not None else bandwidth_limiter.throttle(host)
+        self.stop_event = stop_event
+
+    def download_file(self, ftp, remote_path, local_path, size, remote_mtime=None, streams=4):
+        """ Returns the number of streams used, 0 when no pooled connection was free and nothing was downloaded """
+        # The first range runs on the caller's connection, the others only on connections the pool has free right now
+        leases = ftp_connection_pool.acquire_spare(self.host, self.username, self.password, streams - 1)
+        if not leases:
+            return 0
+        local_dir = os.path.dirname(local_path)
+        if local_dir:
+            os.makedirs(local_dir, exist_ok=True)
+        part_path = local_path + download_engine.part_suffix
+        segment_size = -(-size // (len(leases) + 1))
+        ranges = [(offset, min(segment_size, size - offset)) for offset in range(0, size, segment_size)]
+        errors = []
+        threads = [threading.Thread(target=self.download_range, args=(lease, remote_path, part_path, offset, length, errors), daemon=True) for lease, (offset, length) in zip(leases, ranges[1:])]
+        for lease in leases[len(threads):]:
+            lease.release()
+        try:
+            with open(part_path, 'wb') as file:
+                self.preallocate(file, size)
+
+            for thread in threads:
+                thread.start()
+            try:
+                self.receive_range(ftp, remote_path, part_path, *ranges[0])
+            except Exception as e:
+                # The other ranges still hold their leases, wait for them before giving up
+                errors.append(e)
+            for thread in threads:
+                thread.join()
+            if errors:
+                raise errors[0]
+
+            # Every range reported its full length, check the result and that the remote file did not change meanwhile
+            local_size = os.path.getsize(part_path)
+            if local_size != size:
+                raise ftplib.error_reply(f"Assembled size {local_size} does not match remote size {size}")
+            ftp.voidcmd('TYPE I')
+            remote_size = ftp.size(remote_path)
+            if remote_size != size:
+                raise ftplib.error_reply(f"{remote_path} changed size during the download ({size} -> {remote_size})")
+            if remote_mtime is not None:
+                os.utime(part_path, (remote_mtime, remote_mtime))
+            os.replace(part_path, local_path)
+            return len(ranges)
+        except BaseException:
+            for lease in leases:
+                lease.release()  # No-op for the ranges that ran
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+            raise
+
+    def preallocate(self, file, size):
+        # Reserve the blocks up front so the ranges do not fragment the file, a sparse truncate is the fallback
+        if size and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(file.fileno(), 0, size)
+                return
+            except OSError:
+                pass
+        file.truncate(size)
+
+    def download_range(self, lease, remote_path, part_path, offset, length, errors):
+        try:
+            with lease:
+                self.receive_range(lease.ftp, remote_path, part_path, offset, length)
+        except Exception as e:
+            errors.append(e)
+
+    def receive_range(self, ftp, remote_path, part_path, offset, length):
+        blocksize, _ = transfer_tuner.get(ftp.host, upload_engine.blocksize)
+        ftp.voidcmd('TYPE I')
+        conn = ftp.transfercmd(f'RETR {remote_path}', rest=offset)
+        received = 0
+        try:
+            with open(part_path, 'r+b') as file:
+                file.seek(offset)
+                while received < length:
+                    if self.stop_event is not None and self.stop_event.is_set():
+                        raise FTPManagerTransferStopped(f"Stopped while downloading {remote_path}")
+                    block = conn.recv(min(blocksize, length - received))
+                    if not block:
+                        break
+                    file.write(block)
+                    received += len(block)
+                    self.throttle.consume(len(block))
+        finally:
+            conn.close()
+        # Closing the data connection before the end of the file makes most servers answer 426 or 451
+        try:
+            ftp.voidresp()
+        except ftplib.error_temp as e:
+            if str(e)[:3] not in ('426', '451'):
+                raise
+        if received < length:
+            raise EOFError(f"Range at {offset} of {remote_path} ended after {received} of {length} bytes")
+
+class FTPManagerMirror:
+    """ Mirrors a remote folder into a local one, fetching only new or changed files over parallel pooled connections """
+
+    def __init__(self, host, username, password, remote_folder, local_folder, connections, log_func, throttle=None, segmented_streams=0):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.remote_folder = remote_folder
+        self.local_folder = local_folder
+        self.connections = max(1, connections)
+        self.log_func = log_func
+        self.throttle = throttle
+        self.segmented_streams = segmented_streams
+
+    def remote_path(self, relative_path):
+        if not relative_path:
+            return self.remote_folder
+        return f"{self.remote_folder.rstrip('/')}/{relative_path}" if self.remote_folder else relative_path
+
+    def local_path(self, relative_path):
+        return os.path.join(self.local_folder, *relative_path.split('/'))
+
+    @staticmethod
+    def parse_timestamp(value):
+        # MLSD modify and MDTM are both YYYYMMDDHHMMSS[.sss] in UTC
+        try:
+            return calendar.timegm(time.strptime(value[:14], '%Y%m%d%H%M%S'))
+        except (TypeError, ValueError):
+            return None
+
+    def list_remote(self, ftp, folders=('',), recursive=True, stop_event=None):
+        """ Return {relative path: (size, mtime)} for every file in folders, and below them when recursive """
+        try:
+            return self.list_remote_mlsd(ftp, folders, recursive, stop_event)
+        except ftplib.error_perm as e:
+            if str(e)[:3] not in ('500', '501', '502', '504'):
+                raise
+            return self.list_remote_nlst(ftp, folders, recursive, stop_event)
+
+    @staticmethod
+    def check_stopped(stop_event, remote_path):
+        # A large tree takes many round trips to list, stopping the mirror does not wait for the whole walk
+        if stop_event is not None and stop_event.is_set():
+            raise FTPManagerTransferStopped(f"Stopped while listing {remote_path}")
+
+    def list_remote_mlsd(self, ftp, folders=('',), recursive=True, stop_event=None):
+        files = {}
+        pending = list(folders)
+        while pending:
+            relative_dir = pending.pop()
+            self.check_stopped(stop_event, self.remote_path(relative_dir))
+            for name, facts in ftp.mlsd(self.remote_path(relative_dir), facts=['type', 'size', 'modify']):
+                entry_type = facts.get('type', '').lower()
+                relative_path = f"{relative_dir}/{name}" if relative_dir else name
+                if entry_type == 'dir':
+                    if recursive:
+                        pending.append(relative_path)
+                elif entry_type == 'file' and not name.endswith(download_engine.part_suffix):
+                    files[relative_path] = (int(facts.get('size', 0)), self.parse_timestamp(facts.get('modify')))
+        return files
+
+    def list_remote_nlst(self, ftp, folders=('',), recursive=True, stop_event=None):
+        # Servers without MLSD: entries that have no SIZE are taken to be directories
+        files = {}
+        pending = list(folders)
+        while pending:
+            relative_dir = pending.pop()
+            entries = ftp.nlst(self.remote_path(relative_dir))
+            ftp.voidcmd('TYPE I')  # NLST leaves the connection in ASCII mode, where SIZE is refused
+            for entry in entries:
+                name = entry.rstrip('/').rsplit('/', 1)[-1]
+                if name in ('.', '..') or name.endswith(download_engine.part_suffix):
+                    continue
+                relative_path = f"{relative_dir}/{name}" if relative_dir else name
+                self.check_stopped(stop_event, self.remote_path(relative_path))
+                try:
+                    size = ftp.size(self.remote_path(relative_path))
+                except ftplib.error_perm:
+                    if recursive:
+                        pending.append(relative_path)
+                    continue
+                try:
+                    mtime = self.parse_timestamp(ftp.sendcmd(f'MDTM {self.remote_path(relative_path)}')[4:].strip())
+                except ftplib.error_perm:
+                    mtime = None
+                files[relative_path] = (size, mtime)
+        return files
+
+    def needs_download(self, relative_path, size, mtime):
+        try:
+            stat = os.stat(self.local_path(relative_path))
+        except FileNotFoundError:
+            return True
+        return stat.st_size != size or (mtime is not None and int(stat.st_mtime) != mtime)
+
+    def run_pass(self, stop_event):
+        """ Scan the remote tree once and download whatever differs locally, returning (downloaded, failed) """
+        with ftp_connection_pool.acquire(self.host, self.username, self.password) as lease:
+            remote_files = self.list_remote(lease.ftp, stop_event=stop_event)
+        pending = deque(path for path, (size, mtime) in sorted(remote_files.items()) if self.needs_download(path, size, mtime))
+        if not pending:
+            return 0, 0
+        self.log_func(f"Mirror found {len(pending)} new or changed of {len(remote_files)} remote files in {self.remote_folder}")
+        results = {'downloaded': 0, 'failed': 0}
+        results_lock = threading.Lock()
+        workers = [threading.Thread(target=self.download_worker, args=(pending, remote_files, results, results_lock, stop_event), daemon=True)
+                   for _ in range(min(self.connections, len(pending)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.log_func(f"Mirror pass finished: {results['downloaded']} downloaded, {results['failed']} failed")
+        return results['downloaded'], results['failed']
+
+    def download_worker(self, pending, remote_files, results, results_lock, stop_event):
+        lease = None
+        try:
+            while not stop_event.is_set():
+                try:
+                    relative_path = pending.popleft()
+                except IndexError:
+                    break
+                size, mtime = remote_files[relative_path]
+                try:
+                    if lease is None:
+                        lease = ftp_connection_pool.acquire(self.host, self.username, self.password)
+                    self.download(lease, relative_path, size, mtime, stop_event)
+                    self.log_func(f"Downloaded {self.remote_path(relative_path)} to {self.local_path(relative_path)}")
+                    outcome = 'downloaded'
+                except FTPManagerTransferStopped:
+                    # The data connection was abandoned mid-transfer, the control connection cannot be reused
+                    if lease is not None:
+                        lease.discard()
+                        lease = None
+                    break
+                except ftplib.all_errors as e:
+                    self.log_func(f"Failed to download {self.remote_path(relative_path)}: {e}")
+                    if lease is not None:
+                        lease.discard()
+                        lease = None
+                    outcome = 'failed'
+                with results_lock:
+                    results[outcome] += 1
+        finally:
+            if lease is not None:
+                lease.release()
+
+    def download(self, lease, relative_path, size, mtime, stop_event=None):
+        remote_path = self.remote_path(relative_path)
+        local_path = self.local_path(relative_path)
+        if self.segmented_streams > 1 and size >= segmented_download_threshold:
+            try:
+                downloader = FTPManagerSegmentedDownloader(self.host, self.username, self.password, self.throttle, stop_event)
+                streams = downloader.download_file(lease.ftp, remote_path, local_path, size, mtime, self.segmented_streams)
+                if streams:
+                    self.log_func(f"Segmented download of {remote_path} finished over {streams} streams")
+                    return
+            except ftplib.all_errors as e:
+                self.log_func(f"Segmented download of {remote_path} failed, falling back to a single stream: {e}")
+                lease.reconnect()
+        download_engine.retrieve(lease.ftp, remote_path, local_path, mtime, self.throttle, stop_event)
+
+class FTPManagerReconciler(FTPManagerMirror):
+    """ Compares a local folder with its remote mapping when monitoring starts and queues what changed while nobody watched """
+
+    def __init__(self, host, username, password, remote_folder, local_folder, connections, log_func, progress_func=None, file_index=None, directory_index=None):
+        super().__init__(host, username, password, remote_folder, local_folder, connections, log_func)
+        self.progress_func = progress_func or (lambda phase, done, total: None)
+        self.file_index = file_index
+        self.directory_index = directory_index
+        self.skipped_directories = 0
+        self.scanned_directories = []  # (relative folder, mtime_ns, digest, subfolders, listed_ns) of every folder listed
+        self.visited_directories = None  # Every folder seen, after a full scan
+
+    def scan_local(self, stop_event, expected=0):
+        """ Return {relative path: (size, mtime_ns)} for every file below the local folder, or below the folders that changed
+        since a clean shutdown when the directory index can be trusted. Folder summaries are only collected here, run()
+        records them once what changed is queued """
+        files = {}
+        pending = ['']
+        directory_index = self.directory_index
+        prune = directory_index is not None and directory_index.trusted
+        visited = set()
+        self.skipped_directories = 0
+        self.scanned_directories = []
+        self.visited_directories = None
+        while pending and not stop_event.is_set():
+            relative_dir = pending.pop()
+            path = self.local_path(relative_dir) if relative_dir else self.local_folder
+            visited.add(relative_dir)
+            if prune:
+                subdirectories = directory_index.unchanged(relative_dir, path)
+                if subdirectories is not None:
+                    # Nothing was added, removed or renamed in here, its files are as the file index remembers them
+                    self.skipped_directories += 1
+                    pending.extend(f"{relative_dir}/{name}" if relative_dir else name for name in subdirectories)
+                    continue
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+                entries = list(os.scandir(path))
+                listed_ns = time.time_ns()
+            except OSError as e:
+                self.log_func(f"Skipping unreadable folder {relative_dir or self.local_folder}: {e}")
+                continue
+            subdirectories = []
+            for entry in entries:
+                relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(relative_path)
+                        subdirectories.append(entry.name)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        files[relative_path] = (stat.st_size, stat.st_mtime_ns)
+                        if len(files) % 1000 == 0:
+                            self.progress_func("Scanning local files", len(files), max(expected, len(files)))
+                except OSError:
+                    continue  # Vanished while scanning, its delete event covers it
+            if directory_index is not None:
+                digest = directory_index.digest([entry.name for entry in entries], subdirectories)
+                self.scanned_directories.append((relative_dir, mtime_ns, digest, tuple(subdirectories), listed_ns))
+        if not prune:
+            self.visited_directories = visited
+        return files
+
+    def needs_upload(self, local, remote):
+        if remote is None:
+            return True
+        local_size, local_mtime_ns = local
+        remote_size, remote_mtime = remote
+        # The server stamps a file when it is stored, a local mtime past that means it changed since
+        return local_size != remote_size or (remote_mtime is not None and local_mtime_ns // 1000000000 > remote_mtime)
+
+    def list_remote_folders(self, folders):
+        """ Files directly in each of folders, a folder the server does not have holds none """
+        files = {}
+        with ftp_connection_pool.acquire(self.host, self.username, self.password) as lease:
+            for done, folder in enumerate(folders, 1):
+                try:
+                    files.update(self.list_remote(lease.ftp, (folder,), recursive=False))
+                except ftplib.error_perm as e:
+                    if not str(e).startswith('550'):
+                        raise
+                if done % 100 == 0 or done == len(folders):
+                    self.progress_func("Listing remote folders", done, len(folders))
+        return files
+
+    def list_remote_files(self):
+        self.progress_func("Listing remote files", 0, 0)
+        with ftp_connection_pool.acquire(self.host, self.username, self.password) as lease:
+            try:
+                return self.list_remote(lease.ftp)
+            except ftplib.error_perm as e:
+                if not str(e).startswith('550'):
+                    raise
+                return {}  # Nothing uploaded yet, the first upload creates the folder
+
+    def run(self, queue_func, stop_event):
+        """ Queue every local file that is missing or differs remotely, returns how many were queued """
+        remote_files = None
+        if self.file_index is None:
+            remote_files = self.list_remote_files()
+        local_files = self.scan_local(stop_event, len(remote_files or ()))
+        if stop_event.is_set():
+            return 0
+        changed = []
+        unindexed = []
+        for path, (size, mtime_ns) in sorted(local_files.items()):
+            local_path = self.local_path(path)
+            if self.file_index is None or local_path not in self.file_index:
+                unindexed.append(path)
+            elif not self.file_index.is_current(local_path, size, mtime_ns):
+                # Changed since it was last in sync, the upload worker hashes it and skips it when only touched
+                changed.append(path)
+        if unindexed:
+            # Only files the index has never seen need the server's listing, and only their folders are listed
+            if remote_files is None:
+                remote_files = self.list_remote_folders(sorted({posixpath.dirname(path) for path in unindexed}))
+            for path in unindexed:
+                if self.needs_upload(local_files[path], remote_files.get(path)):
+                    changed.append(path)
+                elif self.file_index is not None:
+                    self.file_index.synced(self.local_path(path), *local_files[path])
+        for done, relative_path in enumerate(changed, 1):
+            if stop_event.is_set():
+                break
+            queue_func(self.local_path(relative_path))
+            if done % 100 == 0 or done == len(changed):
+                self.progress_func("Queueing changed files", done, len(changed))
+        if self.directory_index is not None and not stop_event.is_set():
+            # Everything that changed is queued and journaled, the summaries may now vouch for these folders
+            self.directory_index.update(self.scanned_directories, self.visited_directories)
+        # Files in skipped folders were not looked at, the remote side can only be compared after a full scan
+        remote_only = len(remote_files.keys() - local_files.keys()) if remote_files is not None and not self.skipped_directories else 0
+        self.log_func(f"Reconciled {self.local_folder} with {self.remote_folder}: {len(changed)} of {len(local_files)} scanned local files queued for upload"
+                      + (f", {self.skipped_directories} unchanged folders skipped" if self.skipped_directories else "")
+                      + (f", {remote_only} remote files have no local copy and were left alone" if remote_only else ""))
+        return len(changed)
+
+class FTPManagerBatchWriter:
+    """ Commits queued SQLite writes to one table from a background thread, everything queued within commit_interval shares one transaction """
+
+    def __init__(self, table, key_columns, columns, commit_interval=journal_commit_interval, batch_size=journal_batch_size):
+        self.table = table
+        # Rows are queued as values for columns, keys as values for key_columns
+        self.delete_sql = f"DELETE FROM {table} WHERE {' AND '.join(f'{column}=?' for column in key_columns)}"
+        self.insert_sql = f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        self.commit_interval = commit_interval
+        self.batch_size = batch_size
+        self.condition = threading.Condition()
+        self.pending_writes = {}  # Key -> row, None removes the entry
+        self.writing = False
+        self.writer = None
+
+    def queue_write(self, key, row):
+        with self.condition:
+            self.pending_writes[key] = row
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.run, name=type(self).__name__, daemon=True)
+                self.writer.start()
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending_writes:
+                    self.condition.wait()
+                # Give records arriving meanwhile the chance to share the commit
+                self.condition.wait_for(lambda: len(self.pending_writes) >= self.batch_size, self.commit_interval)
+                batch = self.pending_writes
+                self.pending_writes = {}
+                self.writing = True
+            try:
+                self.write(batch)
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def write(self, batch):
+        removed = [key for key, row in batch.items() if row is None]
+        rows = [row for row in batch.values() if row is not None]
+        try:
+            conn = sqlite3.connect(master_db_file, timeout=30)
+            c = conn.cursor()
+            c.executemany(self.delete_sql, removed)
+            c.executemany(self.insert_sql, rows)
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            if debug_mode:
+                print(f"SQLite error: {e.args[0]} while writing {len(batch)} {self.table} records")
+
+    def flush(self, timeout=10):
+        """ Wait until everything recorded so far is committed """
+        with self.condition:
+            self.condition.notify_all()
+            return self.condition.wait_for(lambda: not self.pending_writes and not self.writing, timeout)
+
+    def read(self, query, parameters, collect=list):
+        """ collect(rows) for a query run once everything recorded so far is committed, rows are streamed from the cursor """
+        self.flush()
+        try:
+            conn = sqlite3.connect(master_db_file)
+            c = conn.cursor()
+            c.execute(query, parameters)
+            result = collect(c)
+            conn.close()
+            return result
+        except sqlite3.Error as e:
+            if debug_mode:
+                print(f"SQLite error: {e.args[0]} while reading {self.table}")
+            return collect(())
+
+class FTPManagerTransferJournal(FTPManagerBatchWriter):
+    """ Durable record of unfinished monitor operations, keyed by (host, remote_folder, local_path) """
+
+    def record(self, host, local_folder, remote_folder, operation, local_path, state, source_path='', error=''):
+        """ Returns at once, the newest record per path is committed with the next batch """
+        self.queue_write((host, remote_folder, local_path), (host, local_folder, remote_folder, operation, local_path, source_path, state, error, time.time()))
+
+    def complete(self, host, remote_folder, local_path):
+        self.queue_write((host, remote_folder, local_path), None)
+
+    def unfinished(self, host, local_folder, remote_folder):
+        return self.read('SELECT operation, local_path, source_path, state FROM transfer_journal WHERE host=? AND local_folder=? AND remote_folder=? ORDER BY updated',
+                         (host, local_folder, remote_folder))
+
+transfer_journal = FTPManagerTransferJournal(
+    'transfer_journal', ('host', 'remote_folder', 'local_path'),
+    ('host', 'local_folder', 'remote_folder', 'operation', 'local_path', 'source_path', 'state', 'error', 'updated')
+)
+
+class FTPManagerFileIndexStore(FTPManagerBatchWriter):
+    """ Persists the local file index of every monitored mapping in the file_index table """
+
+    def save(self, host, local_folder, remote_folder, local_path, entry):
+        size, mtime_ns, digest, uploaded_digest = entry
+        self.queue_write((host, remote_folder, local_path), (host, local_folder, remote_folder, local_path, size, mtime_ns, digest, uploaded_digest))
+
+    def remove(self, host, remote_folder, local_path):
+        self.queue_write((host, remote_folder, local_path), None)
+
+    def load(self, host, local_folder, remote_folder):
+        return self.read('SELECT local_path, size, mtime_ns, hash, uploaded_hash FROM file_index WHERE host=? AND local_folder=? AND remote_folder=?',
+                         (host, local_folder, remote_folder), lambda rows: {row[0]: row[1:] for row in rows})
+
+file_index_store = FTPManagerFileIndexStore(
+    'file_index', ('host', 'remote_folder', 'local_path'),
+    ('host', 'local_folder', 'remote_folder', 'local_path', 'size', 'mtime_ns', 'hash', 'uploaded_hash')
+)
+
+class FTPManagerFileIndex:
+    """ Size, mtime and content hash of each local file of a mapping, and the hash of what was last uploaded from it """
+
+    def __init__(self, host, local_folder, remote_folder):
+        self.host = host
+        self.local_folder = local_folder
+        self.remote_folder = remote_folder
+        self.lock = threading.Lock()
+        # Local path -> (size, mtime_ns, hash or None, uploaded hash or None); equal hashes, both None included,
+        # mean the file was in sync with the server when it had this size and mtime. The row tuples sqlite returns
+        # are kept as they are, entries are replaced rather than changed in place
+        self.entries = file_index_store.load(host, local_folder, remote_folder)
+
+    def save(self, local_path, entry):
+        file_index_store.save(self.host, self.local_folder, self.remote_folder, local_path, entry)
+
+    def is_current(self, local_path, size, mtime_ns):
+        """ Whether the file is unchanged since it was last known to be in sync """
+        with self.lock:
+            entry = self.entries.get(local_path)
+            return entry is not None and entry[0] == size and entry[1] == mtime_ns and entry[2] == entry[3]
+
+    def __contains__(self, local_path):
+        with self.lock:
+            return local_path in self.entries
+
+    def synced(self, local_path, size, mtime_ns):
+        """ Record a file the server was found to hold already, without reading it """
+        entry = (size, mtime_ns, None, None)
+        with self.lock:
+            self.entries[local_path] = entry
+        self.save(local_path, entry)
+
+    def digest(self, local_path):
+        """ Content hash of the file, read again only when its size or mtime changed since it was last hashed """
+        stat = os.stat(local_path)
+        with self.lock:
+            entry = self.entries.get(local_path)
+            if entry is not None and entry[2] is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                return entry[2]
+        hasher = hashlib.new(file_index_algorithm)
+        with open(local_path, 'rb') as file:
+            while True:
+                buf = file.read(1024 * 1024)
+                if not buf:
+                    break
+                hasher.update(buf)
+        digest = hasher.hexdigest()
+        with self.lock:
+            entry = self.entries.get(local_path)
+            entry = (stat.st_size, stat.st_mtime_ns, digest, entry[3] if entry else None)
+            self.entries[local_path] = entry
+        self.save(local_path, entry)
+        return digest
+
+    def uploaded_digest(self, local_path):
+        with self.lock:
+            entry = self.entries.get(local_path)
+            return entry[3] if entry else None
+
+    def uploaded(self, local_path, digest):
+        with self.lock:
+            entry = self.entries.get(local_path)
+            if entry is None:
+                return
+            entry = entry[:3] + (digest,)
+            self.entries[local_path] = entry
+        self.save(local_path, entry)
+
+    def forget(self, local_path):
+        with self.lock:
+            known = self.entries.pop(local_path, None) is not None
+        if known:
+            file_index_store.remove(self.host, self.remote_folder, local_path)
+
+    def move(self, src_path, dest_path):
+        # The server renamed the file along, what was uploaded from the old name is there under the new one
+        with self.lock:
+            entry = self.entries.pop(src_path, None)
+            self.entries.pop(dest_path, None)
+            if entry is not None:
+                self.entries[dest_path] = entry
+        file_index_store.remove(self.host, self.remote_folder, src_path)
+        if entry is not None:
+            self.save(dest_path, entry)
+        else:
+            file_index_store.remove(self.host, self.remote_folder, dest_path)
+
+    def below(self, local_folder):
+        prefix = local_folder.rstrip(os.sep) + os.sep
+        with self.lock:
+            return [local_path for local_path in self.entries if local_path.startswith(prefix)]
+
+    def forget_folder(self, local_folder):
+        for local_path in self.below(local_folder):
+            self.forget(local_path)
+
+    def move_folder(self, src_folder, dest_folder):
+        for local_path in self.below(src_folder):
+            self.move(local_path, dest_folder + local_path[len(src_folder):])
+
+
+class FTPManagerResumeStore:
+    """ Persists partial upload state in the master database so REST/APPE can continue after a drop or restart """
+
+    def get(self, host, remote_path):
+        try:
+            conn = sqlite3.connect(master_db_file)
+            c = conn.cursor()
+            c.execute('SELECT local_path, local_size, local_mtime, offset FROM upload_resume WHERE host=? AND remote_path=?', (host, remote_path))
+            row = c.fetchone()
+            conn.close()
+            return row
+        except sqlite3.Error as e:
+            if debug_mode:
+                print(f"SQLite error: {e.args[0]} while reading resume point for {remote_path}")
+            return None
+
+    def save(self, host, remote_path, local_path, local_size, local_mtime, offset):
+        try:
+            conn = sqlite3.connect(master_db_file)
+            c = conn.cursor()
+            c.execute('INSERT OR REPLACE INTO upload_resume (host, remote_path, local_path, local_size, local_mtime, offset) VALUES (?, ?, ?, ?, ?, ?)',
+                      (host, remote_path, local_path, local_size, local_mtime, offset))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            if debug_mode:
+                print(f"SQLite error: {e.args[0]} while saving resume point for {remote_path}")
+
+    def clear(self, host, remote_path):
+        try:
+            conn = sqlite3.connect(master_db_file)
+            c = conn.cursor()
+            c.execute('DELETE FROM upload_resume WHERE host=? AND remote_path=?', (host, remote_path))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            if debug_mode:
+                print(f"SQLite error: {e.args[0]} while clearing resume point for {remote_path}")
+
+    def has_partial(self, host, local_path, remote_path):
+        # Only resume when the partial remote file came from this exact version of the local file
+        record = self.get(host, remote_path)
+        if not record:
+            return False
+        stat = os.stat(local_path)
+        return record[0] == local_path and record[1] == stat.st_size and record[2] == stat.st_mtime
+
+    def resume_offset(self, ftp, remote_path, local_size):
+        # The server's size of the partial file is authoritative, the stored offset only lags behind it
+        try:
+            ftp.voidcmd('TYPE I')
+            remote_size = ftp.size(remote_path)
+        except ftplib.error_perm:
+            return 0
+        if remote_size is None or remote_size > local_size:
+            return 0
+        return remote_size
+
+    def upload_file(self, ftp, local_path, remote_path, log_func=None, throttle=None, hasher=None, stop_event=None):
+        stat = os.stat(local_path)
+        local_size = stat.st_size
+        track = local_size >= resume_min_size
+        offset = 0
+        if track and self.has_partial(ftp.host, local_path, remote_path):
+            offset = self.resume_offset(ftp, remote_path, local_size)
+            if offset == local_size:
+                if hasher is not None:
+                    with open(local_path, 'rb') as file:
+                        self.hash_prefix(file, local_size, hasher)
+                self.clear(ftp.host, remote_path)
+                return
+        if track:
+            self.save(ftp.host, remote_path, local_path, local_size, stat.st_mtime, offset)
+
+        position = [offset, offset]  # Bytes sent, bytes sent at the last checkpoint
+
+        def checkpoint(sent):
+            position[0] += sent
+            if position[0] - position[1] >= resume_checkpoint_bytes:
+                position[1] = position[0]
+                self.save(ftp.host, remote_path, local_path, local_size, stat.st_mtime, position[0])
+
+        with open(local_path, 'rb') as file:
+            if offset == 0:
+                upload_engine.store(ftp, f'STOR {remote_path}', file, callback=checkpoint if track else None, throttle=throttle, hasher=hasher, stop_event=stop_event)
+            else:
+                if log_func:
+                    log_func(f"Resuming upload of {local_path} at byte {offset} of {local_size}")
+                if hasher is not None:
+                    self.hash_prefix(file, offset, hasher)
+                file.seek(offset)
+                try:
+                    upload_engine.store(ftp, f'STOR {remote_path}', file, callback=checkpoint, rest=offset, throttle=throttle, hasher=hasher, stop_event=stop_event)
+                except ftplib.error_perm as e:
+                    if str(e)[:3] not in ('500', '501', '502', '504'):
+                        raise
+                    # The server rejected REST, append the remainder instead
+                    file.seek(offset)
+                    upload_engine.store(ftp, f'APPE {remote_path}', file, callback=checkpoint, throttle=throttle, hasher=hasher, stop_event=stop_event)
+        if track:
+            self.clear(ftp.host, remote_path)
+
+    def hash_prefix(self, file, length, hasher):
+        # The part already on the server was hashed in an earlier session, read it once more
+        file.seek(0)
+        remaining = length
+        while remaining > 0:
+            buf = file.read(min(1024 * 1024, remaining))
+            if not buf:
+                break
+            hasher.update(buf)
+            remaining -= len(buf)
+
+upload_resume_store = FTPManagerResumeStore()
+
+class FTPManagerTransferExecutor(QtCore.QObject):
+    """ Runs blocking FTP work on background threads, callbacks for progress and results run on the GUI thread """
+
+    progress_signal = QtCore.pyqtSignal(int, object, object)  # Job id, bytes done, bytes total
+    finished_signal = QtCore.pyqtSignal(int, bool, object)  # Job id, success, result or exception
+
+    def __init__(self, max_workers=transfer_executor_workers):
+        super().__init__()
+        self.max_workers = max_workers
+        self.condition = threading.Condition()
+        self.jobs = deque()
+        self.callbacks = {}  # Job id -> (on_progress, on_finished)
+        self.job_ids = itertools.count(1)
+        self.workers = []
+        self.idle_workers = 0
+        self.progress_signal.connect(self.dispatch_progress)
+        self.finished_signal.connect(self.dispatch_finished)
+
+    def submit(self, func, *args, on_progress=None, on_finished=None):
+        """ Queue func(*args); it receives a progress(done, total) keyword when on_progress is given """
+        job_id = next(self.job_ids)
+        with self.condition:
+            self.callbacks[job_id] = (on_progress, on_finished)
+            self.jobs.append((job_id, func, args, on_progress is not None))
+            if self.idle_workers == 0 and len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self.work, name=f"FTPTransfer-{len(self.workers) + 1}", daemon=True)
+                self.workers.append(worker)
+                worker.start()
+            self.condition.notify()
+        return job_id
+
+    def work(self):
+        while True:
+            with self.condition:
+                self.idle_workers += 1
+                while not self.jobs:
+                    self.condition.wait()
+                self.idle_workers -= 1
+                job_id, func, args, reports_progress = self.jobs.popleft()
+            try:
+                if reports_progress:
+                    result = func(*args, progress=lambda done, total, job_id=job_id: self.progress_signal.emit(job_id, done, total))
+                else:
+                    result = func(*args)
+                self.finished_signal.emit(job_id, True, result)
+            except Exception as e:
+                self.finished_signal.emit(job_id, False, e)
+
+    def dispatch_progress(self, job_id, done, total):
+        on_progress = self.callbacks.get(job_id, (None, None))[0]
+        if on_progress:
+            on_progress(job_id, done, total)
+
+    def dispatch_finished(self, job_id, success, result):
+        _, on_finished = self.callbacks.pop(job_id, (None, None))
+        if on_finished:
+            on_finished(job_id, success, result)
+
+transfer_executor = FTPManagerTransferExecutor()
+
+class FTPManagerAsyncFTP:
+    """ FTP client on asyncio streams: one control connection plus passive data connections, replies raise like ftplib """
+
+    encoding = 'utf-8'
+
+    def __init__(self, host, port=None, timeout=30):
+        self.host = host
+        self.port = port or ftplib.FTP.port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.last_used = time.monotonic()
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        return await self.getresp()
+
+    async def login(self, username, password):
+        resp = await self.sendcmd(f'USER {username}')
+        if resp[0] == '3':
+            resp = await self.sendcmd(f'PASS {password}')
+        if resp[0] != '2':
+            raise ftplib.error_reply(resp)
+        return resp
+
+    async def getline(self):
+        line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+        if not line:
+            raise EOFError("FTP server closed the control connection")
+        return line.decode(self.encoding, 'replace').rstrip('\r\n')
+
+    async def getresp(self):
+        lines = [await self.getline()]
+        if lines[0][3:4] == '-':
+            # Multi-line reply, it ends at the first line with the same code and a space
+            code = lines[0][:3]
+            while True:
+                lines.append(await self.getline())
+                if lines[-1][:3] == code and lines[-1][3:4] != '-':
+                    break
+        resp = '\n'.join(lines)
+        if resp[:1] in ('1', '2', '3'):
+            return resp
+        if resp[:1] == '4':
+            raise ftplib.error_temp(resp)
+        if resp[:1] == '5':
+            raise ftplib.error_perm(resp)
+        raise ftplib.error_proto(resp)
+
+    async def voidresp(self):
+        resp = await self.getresp()
+        if resp[:1] != '2':
+            raise ftplib.error_reply(resp)
+        return resp
+
+    async def sendcmd(self, cmd):
+        if '\r' in cmd or '\n' in cmd:
+            raise ValueError('an illegal newline character should not be contained')
+        self.writer.write((cmd + '\r\n').encode(self.encoding))
+        await self.writer.drain()
+        return await self.getresp()
+
+    async def voidcmd(self, cmd):
+        resp = await self.sendcmd(cmd)
+        if resp[:1] != '2':
+            raise ftplib.error_reply(resp)
+        return resp
+
+    async def transfercmd(self, cmd):
+        # Passive mode only; like ftplib, connect to the control connection's peer rather than the advertised address
+        peer = self.writer.get_extra_info('peername')
+        if ':' in peer[0]:
+            host, port = ftplib.parse229(await self.sendcmd('EPSV'), peer)
+        else:
+            _, port = ftplib.parse227(await self.sendcmd('PASV'))
+            host = peer[0]
+        data_reader, data_writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+        try:
+            resp = await self.sendcmd(cmd)
+            if resp[0] == '2':
+                resp = await self.getresp()
+            if resp[0] != '1':
+                raise ftplib.error_reply(resp)
+        except BaseException:
+            data_writer.close()
+            raise
+        return data_reader, data_writer
+
+    async def pwd(self):
+        return ftplib.parse257(await self.voidcmd('PWD'))
+
+    async def cwd(self, path):
+        return await self.voidcmd(f'CWD {path}')
+
+    async def nlst(self, path=''):
+        await self.voidcmd('TYPE A')
+        data_reader, data_writer = await self.transfercmd(f'NLST {path}' if path else 'NLST')
+        chunks = []
+        try:
+            while True:
+                chunk = await asyncio.wait_for(data_reader.read(65536), self.timeout)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        finally:
+            data_writer.close()
+        await self.voidresp()
+        names = b''.join(chunks).decode(self.encoding, 'replace').splitlines()
+        # Some servers answer with full paths, the callers want names
+        return [name.rsplit('/', 1)[-1] for name in names if name]
+
+    async def quit(self):
+        try:
+            await self.voidcmd('QUIT')
+        finally:
+            self.close()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+class FTPManagerAsyncEngine(QtCore.QObject):
+    """ One background asyncio loop serving remote folder listings for every session """
+
+    finished_signal = QtCore.pyqtSignal(int, bool, object)  # Job id, success, result or exception
+
+    def __init__(self, idle_timeout=idle_connection_timeout, keepalive_interval=connection_keepalive_interval):
+        super().__init__()
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.lock = threading.Lock()
+        self.loop = None
+        self.callbacks = {}  # Job id -> on_finished
+        self.job_ids = itertools.count(1)
+        # Only touched on the loop thread, open connections count against ftp_connection_pool's per-host limit
+        self.idle = {}  # (host, username) -> idle clients, most recently used last
+        self.waiters = {}  # host -> futures of operations waiting for a connection
+        self.finished_signal.connect(self.dispatch_finished)
+
+    def start(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="FTPAsyncEngine", daemon=True).start()
+            return self.loop
+
+    def submit(self, coroutine_function, *args, on_finished=None):
+        """ Schedule coroutine_function(*args) on the loop, on_finished(job_id, success, result) runs on the GUI thread """
+        job_id = next(self.job_ids)
+        self.callbacks[job_id] = on_finished
+        future = asyncio.run_coroutine_threadsafe(coroutine_function(*args), self.start())
+        future.add_done_callback(lambda future: self.job_done(job_id, future))
+        return job_id
+
+    def job_done(self, job_id, future):
+        if future.cancelled():
+            self.finished_signal.emit(job_id, False, asyncio.CancelledError())
+        elif future.exception() is not None:
+            self.finished_signal.emit(job_id, False, future.exception())
+        else:
+            self.finished_signal.emit(job_id, True, future.result())
+
+    def dispatch_finished(self, job_id, success, result):
+        on_finished = self.callbacks.pop(job_id, None)
+        if on_finished:
+            on_finished(job_id, success, result)
+
+    def list_tree(self, host, username, password, path, directories_only=False, on_finished=None):
+        return self.submit(self.run_list_tree, host, username, password, path, directories_only, on_finished=on_finished)
+
+    async def acquire(self, host, username, password):
+        key = (host, username)
+        while True:
+            self.close_expired()
+            idle = self.idle.get(key)
+            if idle:
+                client = idle.pop()
+                if time.monotonic() - client.last_used < self.keepalive_interval:
+                    return client
+                try:
+                    await client.voidcmd('NOOP')
+                    return client
+                except ftplib.all_errors + (asyncio.TimeoutError,):
+                    # The server dropped the idle connection
+                    self.discard(client)
+                    continue
+            # An idle connection of another user hands over its slot, otherwise the shared pool has to have one free
+            if self.evict_idle(host) or ftp_connection_pool.reserve_slot(host):
+                client = FTPManagerAsyncFTP(host)
+                try:
+                    await client.connect()
+                    await client.login(username, password)
+                except BaseException:
+                    self.discard(client)
+                    raise
+                return client
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.setdefault(host, deque()).append(waiter)
+            # Slots freed by threaded users of the pool do not wake the loop, look again every second
+            await asyncio.wait([waiter], timeout=1)
+
+    def wake(self, host):
+        waiters = self.waiters.get(host)
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def release(self, username, client):
+        client.last_used = time.monotonic()
+        self.idle.setdefault((client.host, username), []).append(client)
+        self.wake(client.host)
+        # Idle connections hold slots the threaded pool cannot evict, give them back once they expire
+        self.loop.call_later(self.idle_timeout, self.close_expired)
+
+    def discard(self, client):
+        client.close()
+        ftp_connection_pool.forget_slot(client.host)
+        self.wake(client.host)
+
+    def evict_idle(self, host):
+        # Close an idle connection another user holds on the same host, its slot goes to the caller
+        for (idle_host, _), idle in self.idle.items():
+            if idle_host == host and idle:
+                idle.pop(0).close()
+                return True
+        return False
+
+    def close_expired(self):
+        now = time.monotonic()
+        for idle in self.idle.values():
+            for client in [client for client in idle if now - client.last_used >= self.idle_timeout]:
+                idle.remove(client)
+                self.discard(client)
+
+    async def with_connection(self, host, username, password, operation, retries=3, backoff=1):
+        """ Run operation(client) on a pooled connection, retrying temporary failures on a fresh one """
+        for attempt in range(retries):
+            client = await self.acquire(host, username, password)
+            try:
+                result = await operation(client)
+            except (ftplib.error_perm, FileNotFoundError):
+                # Refused command or missing local file, the connection itself is fine
+                self.release(username, client)
+                raise
+            except (ftplib.error_temp, ConnectionError, EOFError, asyncio.TimeoutError):
+                self.discard(client)
+                if attempt == retries - 1:
+                    raise
+                await asyncio.sleep(backoff * 2 ** attempt)
+                continue
+            except BaseException:
+                self.discard(client)
+                raise
+            self.release(username, client)
+            return result
+
+    async def run_list_tree(self, host, username, password, path, directories_only=False):
+        """ [(name, children or None for files)] below path, None when path is not a directory """
+        async def operation(client):
+            home = await client.pwd()
+
+            async def is_directory(item_path):
+                try:
+                    await client.cwd(item_path)
+                    await client.cwd(home)
+                    return True
+                except ftplib.error_perm:
+                    return False
+
+            async def list_items(item_path):
+                entries = []
+                for item in await client.nlst(item_path):
+                    if item in ('.', '..'):
+                        continue
+                    child_path = os.path.join(item_path, item).replace('\\', '/')
+                    if await is_directory(child_path):
+                        entries.append((item, await list_items(child_path)))
+                    elif not directories_only:
+                        entries.append((item, None))
+                return entries
+
+            return await list_items(path) if not path or await is_directory(path) else None
+        return await self.with_connection(host, username, password, operation)
+
+async_ftp_engine = FTPManagerAsyncEngine()
+
 class FTPManagerFTPApp(QtWidgets.QMainWindow):
     def __init__(self, parent=None):
         super().__init__()
@@ -91,10 +2000,13 @@ class FTPManagerFTPApp(QtWidgets.QMainWindow):
         open_ftp_manager_action.triggered.connect(self.open_ftp_manager)
         open_notification_manager_action = QtWidgets.QAction('Notification Manager', self)
         open_notification_manager_action.triggered.connect(self.show_notification_manager)        
+        bandwidth_manager_action = QtWidgets.QAction('Bandwidth Limits', self)
+        bandwidth_manager_action.triggered.connect(self.show_bandwidth_manager)
         view_menu.addAction(open_ftp_manager_action)
         view_menu.addAction(credential_manager_action)
         view_menu.addAction(folder_manager_action)
         view_menu.addAction(open_notification_manager_action)
+        view_menu.addAction(bandwidth_manager_action)
 
         # Help menu
         help_menu = self.menu_bar.addMenu('Help')
@@ -191,6 +2103,10 @@ class FTPManagerFTPApp(QtWidgets.QMainWindow):
         self.folder_manager = FTPManagerFolderManager(self)
         self.folder_manager.show()
 
+    def show_bandwidth_manager(self):
+        self.bandwidth_manager = FTPManagerBandwidthManager(self)
+        self.bandwidth_manager.show()
+
     def show_quick_connect_manager(self):
         self.quick_connect_manager = FTPManagerQuickConnectManager(self)
         self.quick_connect_manager.show()
@@ -382,9 +2298,102 @@ class FTPManagerFTPApp(QtWidgets.QMainWindow):
                 remote_folder TEXT NOT NULL
             )
         ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS upload_resume (
+                id INTEGER PRIMARY KEY,
+                host TEXT NOT NULL,
+                remote_path TEXT NOT NULL,
+                local_path TEXT NOT NULL,
+                local_size INTEGER NOT NULL,
+                local_mtime REAL NOT NULL,
+                offset INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (host, remote_path)
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS transfer_journal (
+                id INTEGER PRIMARY KEY,
+                host TEXT NOT NULL,
+                local_folder TEXT NOT NULL,
+                remote_folder TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                local_path TEXT NOT NULL,
+                source_path TEXT NOT NULL DEFAULT '',
+                state TEXT NOT NULL,
+                error TEXT NOT NULL DEFAULT '',
+                updated REAL NOT NULL,
+                UNIQUE (host, remote_folder, local_path)
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS file_index (
+                id INTEGER PRIMARY KEY,
+                host TEXT NOT NULL,
+                local_folder TEXT NOT NULL,
+                remote_folder TEXT NOT NULL,
+                local_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT,
+                uploaded_hash TEXT,
+                UNIQUE (host, remote_folder, local_path)
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS directory_index (
+                id INTEGER PRIMARY KEY,
+                host TEXT NOT NULL,
+                local_folder TEXT NOT NULL,
+                remote_folder TEXT NOT NULL,
+                directory TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                subdirectories TEXT NOT NULL,
+                recorded_ns INTEGER NOT NULL,
+                UNIQUE (host, remote_folder, directory)
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS monitor_sessions (
+                id INTEGER PRIMARY KEY,
+                host TEXT NOT NULL,
+                local_folder TEXT NOT NULL,
+                remote_folder TEXT NOT NULL,
+                clean_shutdown INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (host, local_folder, remote_folder)
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS bandwidth_limits (
+                id INTEGER PRIMARY KEY,
+                scope TEXT NOT NULL,
+                target TEXT NOT NULL DEFAULT '',
+                schedule TEXT NOT NULL
+            )
+        ''')
+        self.add_missing_columns(c, 'quick_connects', [
+            ('upload_connections', f'INTEGER NOT NULL DEFAULT {default_upload_connections}'),
+            ('segmented_streams', 'INTEGER NOT NULL DEFAULT 0'),
+            ('tuned_blocksize', 'INTEGER NOT NULL DEFAULT 0'),
+            ('tuned_sndbuf', 'INTEGER NOT NULL DEFAULT 0'),
+            ('sync_direction', "TEXT NOT NULL DEFAULT 'upload'"),
+            ('mirror_interval', f'INTEGER NOT NULL DEFAULT {mirror_interval}'),
+            ('atomic_uploads', 'INTEGER NOT NULL DEFAULT 0'),
+            ('settle_interval', f'REAL NOT NULL DEFAULT {write_settle_interval}'),
+            ('reconcile_on_start', 'INTEGER NOT NULL DEFAULT 1'),
+            ('watch_mode', "TEXT NOT NULL DEFAULT 'events'"),
+        ])
         conn.commit()
         conn.close()
 
+    def add_missing_columns(self, cursor, table, columns):
+        # Databases created by older versions lack the newer columns, add them in place
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing_columns = {row[1] for row in cursor.fetchall()}
+        for column, definition in columns:
+            if column not in existing_columns:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
     def setup_logging(self):
         if not os.path.exists('logs'):
             os.makedirs('logs')
@@ -487,8 +2496,7 @@ class FTPManagerFTPApp(QtWidgets.QMainWindow):
             if quick_connect_id in self.active_connections:
                 tab = self.active_connections[quick_connect_id]
                 tab.stop_monitoring()
-                if tab.ftp:
-                    tab.ftp.quit()
+                tab.close_ftp_connection()
                 del self.active_connections[quick_connect_id]
                 self.update_tray_icon()  # Update the existing tray icon
             else:
@@ -501,8 +2509,7 @@ class FTPManagerFTPApp(QtWidgets.QMainWindow):
             if quick_connect_id in self.active_connections:
                 tab = self.active_connections[quick_connect_id]
                 tab.stop_monitoring()
-                if tab.ftp:
-                    tab.ftp.quit()
+                tab.close_ftp_connection()
                 self.close_tab(self.tabs.indexOf(tab))
                 del self.active_connections[quick_connect_id]
                 self.update_tray_icon()  # Update the existing tray icon
@@ -545,27 +2552,23 @@ class FTPManagerFTPApp(QtWidgets.QMainWindow):
         """ Check if a session is connected """
         try:
             self.log(f"Checking connection status for session: {session_name}")
-            connected = session_name in self.ftp_connections and self.ftp_connections[session_name].sock is not None
+            connected = session_name in self.ftp_connections and self.ftp_connections[session_name].is_connected()
             self.log(f"Connection status for session {session_name}: {'Connected' if connected else 'Not Connected'}")
             return connected
         except Exception as e:
             self.log(f"Error checking connection status for session {session_name}: {e}")
             return False
 
-    def get_ftp_connection(self, session_name):
-        """ Get the FTP connection for a given session """
-        try:
-            self.log(f"Retrieving FTP connection for session: {session_name}")
-            for i in range(self.tabs.count()):
-                tab = self.tabs.widget(i)
-                if isinstance(tab, FTPManagerFTPTab) and tab.session_name == session_name:
-                    self.log(f"FTP connection found for session: {session_name}")
-                    return tab.ftp
-            self.log(f"No FTP connection found for session: {session_name}")
-            return None
-        except Exception as e:
-            self.log(f"Error retrieving FTP connection for session {session_name}: {e}")
-            return None
+    def get_session_credentials(self, session_name):
+        """ (host, username, password) of the tab holding a session, None if there is none; GUI thread only """
+        self.log(f"Retrieving FTP connection for session: {session_name}")
+        for i in range(self.tabs.count()):
+            tab = self.tabs.widget(i)
+            if isinstance(tab, FTPManagerFTPTab) and tab.session_name == session_name:
+                self.log(f"FTP connection found for session: {session_name}")
+                return tab.host, tab.username, tab.password
+        self.log(f"No FTP connection found for session: {session_name}")
+        return None
         
     def update_log_from_tab(self, message):
         current_tab = self.tabs.currentWidget()
@@ -676,6 +2679,7 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
         self.notifications_enabled = notifications_enabled
         self.notification_filter = FTPManagerNotificationFilter(self)
         self.ftp = None
+        self.connected = False  # Logged in once, monitors and transfers lease their own pooled connections
         self.local_path = ""
         self.remote_path = ""
         self.username = ""
@@ -699,7 +2703,13 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
         pass
 
     def is_connected(self):
-        return self.ftp is not None and self.ftp.sock is not None
+        return self.connected
+
+    def close_ftp_connection(self):
+        self.connected = False
+        if self.host and self.username:
+            # Monitors have returned their connections by now, log those out as well
+            ftp_connection_pool.close_idle(self.host, self.username)
 
     def connect_ftp(self):
         try:
@@ -710,7 +2720,7 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
             else:
                 self.log(f"Disconnecting session: {self.session_name}")
                 self.stop_monitoring()
-                self.ftp.quit()
+                self.close_ftp_connection()
                 self.ftp_connections = {}
                 self.connect_button.setText('Connect')
                 self.quick_connect_now_button.setText('Quick Connect Now')
@@ -739,13 +2749,33 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
                 return
 
             self.log(f"Connecting to FTP server at {host} with username {username}")
-            self.ftp = self.connect_with_retry(host, username, password)
+            transfer_executor.submit(
+                self.connect_with_retry, host, username, password,
+                on_finished=lambda job_id, success, result: self.on_connect_finished(success, result, host, username, password)
+            )
+        except Exception as e:
+            self.log(f"Error in _connect_ftp_thread: {e}", "Connection Error")
+            self.connect_button.setText('Connect')
+
+    def on_connect_finished(self, success, result, host, username, password):
+        if not success:
+            self.log(f"FTP connection error: {result}", "Connection Error")
+            self.connect_button.setText('Connect')
+            return
+        try:
+            # The login succeeded, the connection goes back to the pool instead of holding one of the host's slots
+            result.release()
+            self.connected = True
             self.log(f"Connected and logged in to FTP server: {host}")
 
-            # Store the connection in the parent
+            self.username = username
+            self.host = host
+            self.password = password
+
+            # Store the session in the parent
             parent_app = self.get_parent_app()
             if parent_app:
-                parent_app.ftp_connections[self.session_name] = self.ftp
+                parent_app.ftp_connections[self.session_name] = self
                 self.log(f"Stored FTP connection for session: {self.session_name}")
 
                 # Update the tab name to reflect the session
@@ -756,11 +2786,8 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
 
             # Start loading folders in a separate thread
             self.start_folder_loading_thread()
-        except ftplib.all_errors as e:
-            self.log(f"FTP connection error: {e}", "Connection Error")
-            self.connect_button.setText('Connect')
         except Exception as e:
-            self.log(f"Error in _connect_ftp_thread: {e}", "Connection Error")
+            self.log(f"Error in on_connect_finished: {e}", "Connection Error")
             self.connect_button.setText('Connect')
 
     def get_parent_app(self):
@@ -905,8 +2932,12 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
         self.monitor_button.setCheckable(True)
         self.monitor_button.clicked.connect(self.toggle_monitor_folder)
 
+        self.reconcile_progress_bar = QtWidgets.QProgressBar(self)
+        self.reconcile_progress_bar.setVisible(False)
+
         monitor_layout = QtWidgets.QHBoxLayout()
         monitor_layout.addWidget(self.monitor_button)
+        monitor_layout.addWidget(self.reconcile_progress_bar)
 
         self.folder_section_layout.addLayout(monitor_layout)
         self.folder_section.setLayout(self.folder_section_layout)
@@ -1058,6 +3089,37 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
                 print(f"SQLite error: {e.args[0]} while retrieving folder paths for Folder: {folder_name}")
             return None
         
+    def get_quick_connect_settings(self, host, username, local_folder, remote_folder):
+        # Transfer settings stored alongside a quick connect, defaults apply when there is none
+        settings = {
+            'id': None,
+            'upload_connections': default_upload_connections,
+            'segmented_streams': 0,
+            'tuned_blocksize': 0,
+            'tuned_sndbuf': 0,
+            'sync_direction': 'upload',
+            'mirror_interval': mirror_interval,
+            'atomic_uploads': 0,
+            'settle_interval': write_settle_interval,
+            'reconcile_on_start': 1,
+            'watch_mode': 'events',
+        }
+        try:
+            conn = sqlite3.connect(master_db_file)
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            c.execute('SELECT * FROM quick_connects WHERE host=? AND username=? AND local_folder=? AND remote_folder=?', (host, username, local_folder, remote_folder))
+            row = c.fetchone()
+            conn.close()
+            if row:
+                for key in settings:
+                    if key in row.keys() and row[key] is not None:
+                        settings[key] = row[key]
+        except sqlite3.Error as e:
+            if debug_mode:
+                print(f"SQLite error: {e.args[0]} while retrieving quick connect settings for {username}@{host}")
+        return settings
+
     def update_folder_dropdowns(self):
         try:
             parent = self
@@ -1127,11 +3189,9 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
     def connect_with_retry(self, host, username, password, retries=3, backoff=1):
         while retries > 0:
             try:
-                ftp = ftplib.FTP(host)
-                ftp.login(username, password)
-                return ftp
+                return ftp_connection_pool.acquire(host, username, password)
             except ftplib.all_errors as e:
-                self.log(f"Error connecting to FTP: {e}, retries left: {retries}")
+                self.log_signal.emit(f"Error connecting to FTP: {e}, retries left: {retries}")
                 time.sleep(backoff)
                 backoff *= 2  # Exponential backoff
                 retries -= 1
@@ -1156,12 +3216,7 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
             QtCore.QTimer.singleShot(0, self._quick_connect_thread)
         else:
             self.stop_monitoring()
-            if self.ftp:
-                try:
-                    self.ftp.quit()
-                except:
-                    pass
-            self.ftp = None
+            self.close_ftp_connection()
             self.ftp_connections = {}
             self.quick_connect_now_button.setText('Quick Connect Now')
             self.connect_button.setText('Connect')
@@ -1180,19 +3235,38 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
             if password is None:
                 raise ValueError(f"No password found for {username}@{host}")
 
-            self.ftp = ftplib.FTP(host, timeout=30)
-            self.ftp.login(username, password)
+            transfer_executor.submit(
+                ftp_connection_pool.acquire, host, username, password,
+                on_finished=lambda job_id, success, result: self.on_quick_connect_finished(success, result, host, username, password, local_folder, remote_folder)
+            )
+        except ValueError as ve:
+            self.log(f"Quick Connect error: {str(ve)}", "Connection Error")
+            self.quick_connect_now_button.setText('Quick Connect Now')
+        except Exception as e:
+            self.log(f"Error in _quick_connect_thread: {e}", "Connection Error")
+            self.quick_connect_now_button.setText('Quick Connect Now')
+
+    def on_quick_connect_finished(self, success, result, host, username, password, local_folder, remote_folder):
+        if not success:
+            self.log(f"FTP connection error: {result}", "Connection Error")
+            self.quick_connect_now_button.setText('Quick Connect Now')
+            return
+        try:
+            # The login succeeded, the connection goes back to the pool instead of holding one of the host's slots
+            result.release()
+            self.connected = True
             self.log(f"Connected and logged in to FTP server: {host}")
 
             self.username = username
             self.host = host
+            self.password = password
             self.local_folder = local_folder
             self.remote_folder = remote_folder
 
-            # Store the connection in the parent
+            # Store the session in the parent
             parent_app = self.get_parent_app()
             if parent_app:
-                parent_app.ftp_connections[self.session_name] = self.ftp
+                parent_app.ftp_connections[self.session_name] = self
                 self.log(f"Stored FTP connection for session: {self.session_name}")
 
                 # Update the tab name to reflect the session
@@ -1205,16 +3279,10 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
             self.start_folder_loading_thread()
 
             # Start the observer for folder monitoring
-            self.start_monitor_with_folder(self.local_folder, self.remote_folder, username, password)
-
-        except ValueError as ve:
-            self.log(f"Quick Connect error: {str(ve)}", "Connection Error")
-            self.quick_connect_now_button.setText('Quick Connect Now')
-        except ftplib.all_errors as e:
-            self.log(f"FTP connection error: {e}", "Connection Error")
-            self.quick_connect_now_button.setText('Quick Connect Now')
+            settings = self.get_quick_connect_settings(host, username, local_folder, remote_folder)
+            self.start_monitor_with_folder(self.local_folder, self.remote_folder, username, password, settings)
         except Exception as e:
-            self.log(f"Error in _quick_connect_thread: {e}", "Connection Error")
+            self.log(f"Error in on_quick_connect_finished: {e}", "Connection Error")
             self.quick_connect_now_button.setText('Quick Connect Now')
 
     def on_quick_connect_successful(self, ftp, local_folder, remote_folder):
@@ -1233,7 +3301,7 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
 
     def start_folder_loading_thread(self):
         self.folder_loading_thread = QtCore.QThread()
-        self.folder_loading_worker = FolderLoadingWorker(self.ftp, self.folder_tree)
+        self.folder_loading_worker = FolderLoadingWorker(self.host, self.username, self.password, self.folder_tree)
         self.folder_loading_worker.moveToThread(self.folder_loading_thread)
         self.folder_loading_thread.started.connect(self.folder_loading_worker.run)
         self.folder_loading_worker.finished.connect(self.folder_loading_thread.quit)
@@ -1270,10 +3338,31 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
             return False
 
     def populate_folder(self, item, column):
+        if not self.host:
+            return
         path = self.get_item_path(item)
-        if self.is_directory(path):
+        async_ftp_engine.list_tree(
+            self.host, self.username, self.password, path,
+            on_finished=lambda job_id, success, result: self.on_folder_listed(item, path, success, result)
+        )
+
+    def on_folder_listed(self, item, path, success, result):
+        if not success:
+            self.log_signal.emit(f"Error listing {path}: {result}")
+            return
+        if result is None:
+            return  # A file, nothing to expand
+        try:
             item.takeChildren()
-            self.add_folder_items(path, item)
+        except RuntimeError:
+            return  # The tree was reloaded while listing
+        self.add_listed_items(item, result)
+
+    def add_listed_items(self, parent_item, entries):
+        for name, children in entries:
+            tree_item = QtWidgets.QTreeWidgetItem(parent_item, [name])
+            if children:
+                self.add_listed_items(tree_item, children)
 
     def get_item_path(self, item):
         path = []
@@ -1294,22 +3383,31 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
         if folder and folder != "None":
             self.monitor_folder(folder)
             
-    def start_monitor_with_folder(self, local_folder, remote_folder, username, password):
+    def start_monitor_with_folder(self, local_folder, remote_folder, username, password, settings=None):
         try:
             if local_folder and local_folder != "None" and remote_folder and remote_folder != "None":
+                if settings and settings.get('sync_direction') == 'download':
+                    mirror_thread = FTPManagerMirrorThread(local_folder, remote_folder, self.host, username, password, settings)
+                    mirror_thread.log_signal.connect(self.log_signal.emit)
+                    mirror_thread.start()
+                    self.observers[remote_folder] = mirror_thread
+                    return
                 observer_thread = FTPManagerObserverThread(
                     local_path=local_folder,
                     remote_path=remote_folder,
-                    ftp=self.ftp,
+                    host=self.host,
                     log_func=self.log_signal.emit,
                     quickconnect_in_use=self.quickconnect_in_use,
                     notifications_enabled=self.notifications_enabled,
                     notification_filter=self.notification_filter,
                     username=username,
-                    password=password
+                    password=password,
+                    settings=settings
                 )
                 observer_thread.log_signal.connect(self.log_signal.emit)
                 observer_thread.tray_notification_signal.connect(self.tray_notification_signal)
+                observer_thread.reconcile_progress_signal.connect(self.update_reconcile_progress)
+                observer_thread.reconcile_finished_signal.connect(self.on_reconcile_finished)
                 observer_thread.start()
                 self.observers[remote_folder] = observer_thread
         except Exception as e:
@@ -1322,14 +3420,28 @@ class FTPManagerFTPTab(QtWidgets.QWidget):
             observer_thread = FTPManagerObserverThread(
                 local_path=local_path,
                 remote_path=folder_path,
-                ftp=self.ftp,
+                host=self.host,
                 log_func=self.log_signal.emit,
-                quickconnect_in_use=self.quickconnect_in_use
+                quickconnect_in_use=self.quickconnect_in_use,
+                username=self.username,
+                password=self.password
             )
             observer_thread.log_signal.connect(self.log_signal.emit)
+            observer_thread.reconcile_progress_signal.connect(self.update_reconcile_progress)
+            observer_thread.reconcile_finished_signal.connect(self.on_reconcile_finished)
             observer_thread.start()
             self.observers[folder_path] = observer_thread
 
+    def update_reconcile_progress(self, phase, done, total):
+        self.reconcile_progress_bar.setVisible(True)
+        # A total of 0 shows the busy indicator while the amount of work is unknown
+        self.reconcile_progress_bar.setRange(0, total)
+        self.reconcile_progress_bar.setValue(min(done, total))
+        self.reconcile_progress_bar.setFormat(f"{phase}: {done}/{total}" if total else phase)
+
+    def on_reconcile_finished(self, queued):
+        self.reconcile_progress_bar.setVisible(False)
+
     def stop_monitoring(self):
         for remote_folder, observer in self.observers.items():
             observer.stop()
@@ -1781,16 +3893,23 @@ class FolderLoadingWorker(QtCore.QObject):
     disable_tree = QtCore.pyqtSignal(bool)
     show_progress = QtCore.pyqtSignal(bool)
 
-    def __init__(self, ftp, folder_tree_widget):
+    def __init__(self, host, username, password, folder_tree_widget):
         super().__init__()
-        self.ftp = ftp
+        self.host = host
+        self.username = username
+        self.password = password
+        self.ftp = None
         self.folder_tree_widget = folder_tree_widget
 
     def run(self):
         try:
             self.disable_tree.emit(True)
             self.show_progress.emit(True)
-            self.populate_folder_tree()
+            with ftp_connection_pool.acquire(self.host, self.username, self.password) as lease:
+                self.ftp = lease.ftp
+                self.home = self.ftp.pwd()
+                self.populate_folder_tree()
+            self.ftp = None
             self.finished.emit()
         except Exception as e:
             print(f'Error in folder loading worker: {e}')
@@ -1822,88 +3941,127 @@ class FolderLoadingWorker(QtCore.QObject):
     def is_directory(self, path):
         try:
             self.ftp.cwd(path)
-            self.ftp.cwd('..')
+            # Back to where we started, "CWD .." would leave the pooled connection in the parent of nested paths
+            self.ftp.cwd(self.home)
             return True
         except:
             return False
 
-class FTPManagerFTPEventHandler(FileSystemEventHandler):
-    log_signal = QtCore.pyqtSignal(str)
-
-    def __init__(self, ftp, remote_folder, local_folder, log_func=None):
-        self.ftp = ftp
-        self.remote_folder = remote_folder
-        self.local_folder = local_folder
-        self.log_func = log_func  # This can be used if additional logging is needed
+class FTPManagerOverwriteQuestion:
+    """ One overwrite question and its answer, No unless the user says Yes """
 
-    def on_created(self, event):
-        if not event.is_directory:
-            self.upload_file(event.src_path)
+    def __init__(self, remote_path):
+        self.remote_path = remote_path
+        self.answer = False
+        self.answered = threading.Event()
 
-    def on_modified(self, event):
-        if not event.is_directory:
-            self.upload_file(event.src_path)
+class FTPManagerOverwritePrompt(QtCore.QObject):
+    """ Asks the overwrite question on the GUI thread on behalf of background threads """
 
-    def on_deleted(self, event):
-        if not event.is_directory:
-            self.delete_file(event.src_path)
+    ask_signal = QtCore.pyqtSignal(object)
 
-    def upload_file(self, local_path):
-        relative_path = os.path.relpath(local_path, self.local_folder)
-        remote_path = os.path.join(self.remote_folder, relative_path).replace('\\', '/')
-        #self.log_signal.emit(f"Uploading file: Local Path: {local_path}, Relative Path: {relative_path}, Remote Path: {remote_path}")
+    def __init__(self):
+        super().__init__()
+        self.questions = deque()
+        self.showing = False
+        # Queued, the asking thread waits on the question itself and can give up when its monitor stops
+        self.ask_signal.connect(self.ask, QtCore.Qt.QueuedConnection)
+
+    def ask(self, question):
+        # The dialog's event loop may deliver further questions, they wait their turn instead of stacking dialogs
+        self.questions.append(question)
+        if self.showing:
+            return
+        self.showing = True
         try:
-            self.ftp_upload_thread = FTPManagerFTPUploadThread(self.ftp, local_path, remote_path)
-            self.ftp_upload_thread.start()
-        except Exception as e:
-            self.log_signal.emit(f'Error starting upload thread: {e}')
+            while self.questions:
+                question = self.questions.popleft()
+                if question.answered.is_set():
+                    continue  # Withdrawn before it was shown
+                reply = QtWidgets.QMessageBox.question(None, 'Confirm Overwrite', f'File {question.remote_path} already exists. Do you want to overwrite it?', QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No)
+                question.answer = reply == QtWidgets.QMessageBox.Yes
+                question.answered.set()
+        finally:
+            self.showing = False
+
+    def confirm(self, remote_path, cancelled=None):
+        """ The user's answer, or No once cancelled is set: a GUI thread waiting for the asking thread could never show the dialog """
+        question = FTPManagerOverwriteQuestion(remote_path)
+        if QtCore.QThread.currentThread() == self.thread():
+            self.ask(question)
+            return question.answer
+        self.ask_signal.emit(question)
+        while not question.answered.wait(0.1):
+            if cancelled is not None and cancelled.is_set():
+                question.answered.set()
+                return False
+        return question.answer
 
-    def delete_file(self, local_path):
-        relative_path = os.path.relpath(local_path, self.local_folder)
-        remote_path = os.path.join(self.remote_folder, relative_path).replace('\\', '/')
-        #self.log_signal.emit(f"Deleting file: Local Path: {local_path}, Relative Path: {relative_path}, Remote Path: {remote_path}")
-        try:
-            self.ftp_delete_thread = FTPManagerFTPDeleteThread(self.ftp, remote_path)
-            self.ftp_delete_thread.start()
-        except Exception as e:
-            self.log_signal.emit(f'Error starting delete thread: {e}')
+overwrite_prompt = FTPManagerOverwritePrompt()
 
 class FTPManagerFTPEventHandlerWrapper(QtCore.QObject, FileSystemEventHandler):
     log_signal = QtCore.pyqtSignal(str)
     tray_notification_signal = QtCore.pyqtSignal(str, str)
     upload_complete_signal = QtCore.pyqtSignal(str, str, bool)
     reconnection_signal = QtCore.pyqtSignal()
-    process_event_signal = QtCore.pyqtSignal()
+    shutdown_signal = QtCore.pyqtSignal()  # Emitted from any thread, ends the observer thread's event loop
 
-    def __init__(self, ftp, remote_folder, local_folder, quickconnect_in_use, notifications_enabled, notification_filter, log_func, username, password):
+    def __init__(self, host, remote_folder, local_folder, quickconnect_in_use, notifications_enabled, notification_filter, log_func, username, password, settings=None):
         super().__init__()
-        self.ftp = ftp
         self.remote_folder = remote_folder
         self.local_folder = local_folder
         self.quickconnect_in_use = quickconnect_in_use
         self.notifications_enabled = notifications_enabled
         self.notification_filter = notification_filter
-        self.upload_queue = deque()
-        self.uploading = False
+        self.upload_queue = FTPManagerTransferQueue()  # Tasks ready to upload
+        self.retry_queue = []  # Heap of (due, sequence, task) waiting out a backoff
+        self.retry_sequence = itertools.count()
+        self.queued_uploads = {}  # Local path -> task, ready or backing off
+        self.upload_condition = upload_pool.condition  # The queues are served by the shared upload threads
+        self.uploads_in_progress = set()
+        self.requeue_after_upload = set()
+        self.reconnect_attempts = 0
+        self.reconnect_pending = False
+        settings = settings or {}
+        self.upload_connections = max(1, settings.get('upload_connections') or default_upload_connections)
+        self.segmented_streams = settings.get('segmented_streams') or 0
+        self.atomic_uploads = bool(settings.get('atomic_uploads'))
+        self.quick_connect_id = settings.get('id')
+        self.throttle = bandwidth_limiter.throttle(host, self.quick_connect_id)
+        transfer_tuner.seed(host, settings.get('tuned_blocksize'), settings.get('tuned_sndbuf'))
+        self.remote_directories = FTPManagerRemoteDirectoryCache(remote_folder)
+        self.file_index = FTPManagerFileIndex(host, local_folder, remote_folder)
+        self.directory_index = FTPManagerDirectoryIndex(host, local_folder, remote_folder)
+        settle_interval = settings.get('settle_interval')
+        self.settling = FTPManagerQuiescenceDetector(write_settle_interval if settle_interval is None else settle_interval, self.queue_upload)
+        self.uploads_stopped = False
+        self.stopping = threading.Event()  # Set while the monitor shuts down, cancels prompts and transfers in flight
         self.uploaded_files = set()
         self.last_modified_time = {}
-        self.files_in_process = set()
+        self.coalescer = FTPManagerEventCoalescer()
         self.upload_complete_signal.connect(self.on_upload_complete)
         self.log_signal.connect(log_func)
         self.tray_notification_signal.connect(lambda title, message: log_func(message))
         self.reconnection_signal.connect(self.reconnect)
-        self.process_event_signal.connect(self.process_event_queue)
-        self.event_queue = []
+        self.shutdown_signal.connect(self.shutdown)
 
-        # Store FTP credentials
-        self.ftp_host = self.ftp.host
+        # Store FTP credentials and lease a connection of our own for deletes and renames
+        self.ftp_host = host
         self.ftp_user = username
         self.ftp_pass = password
+        self.ftp_lease = ftp_connection_pool.acquire(host, username, password)
+        self.ftp = self.ftp_lease.ftp
+        if self.segmented_streams > 1:
+            FTPManagerSegmentedUploader.probe(self.ftp, self.remote_folder, self.log_signal.emit)
 
         # Move timer creation to the main thread
         QtCore.QTimer.singleShot(0, self.setup_timers)
+        upload_pool.register(self)
+        self.replay_journal()
         
     def check_connection(self):
+        if self.reconnect_pending:
+            return
         try:
             self.ftp.voidcmd("NOOP")
         except:
@@ -1918,26 +4076,25 @@ class FTPManagerFTPEventHandlerWrapper(QtCore.QObject, FileSystemEventHandler):
             return self.reconnect()
 
     def reconnect(self):
+        # One attempt per call, further attempts are scheduled on a timer instead of blocking this thread
+        self.reconnect_pending = False
         self.log_signal.emit("Attempting to reconnect...")
         try:
-            self.ftp.close()
-        except:
-            pass
-
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                self.ftp = ftplib.FTP(self.ftp_host, timeout=30)
-                self.ftp.login(self.ftp_user, self.ftp_pass)
-                self.log_signal.emit("Reconnection successful")
-                return True
-            except Exception as e:
-                self.log_signal.emit(f"Reconnection attempt {attempt + 1} failed: {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(5)  # Wait for 5 seconds before retrying
-
-        self.log_signal.emit("Failed to reconnect after multiple attempts")
-        return False
+            self.ftp = self.ftp_lease.reconnect()
+            self.reconnect_attempts = 0
+            self.log_signal.emit("Reconnection successful")
+            return True
+        except Exception as e:
+            self.reconnect_attempts += 1
+            delay = upload_retry_scheduler.delay('connection', self.reconnect_attempts)
+            if delay is None:
+                self.reconnect_attempts = 0
+                self.log_signal.emit(f"Failed to reconnect after multiple attempts: {e}")
+                return False
+            self.log_signal.emit(f"Reconnection attempt {self.reconnect_attempts} failed: {str(e)}, next attempt in {delay:.0f} seconds")
+            self.reconnect_pending = True
+            QtCore.QTimer.singleShot(int(delay * 1000), self.reconnect)
+            return False
 
     def show_notification(self, title, message):
         if self.notifications_enabled:
@@ -1947,151 +4104,341 @@ class FTPManagerFTPEventHandlerWrapper(QtCore.QObject, FileSystemEventHandler):
         self.connection_check_timer = QtCore.QTimer(self)
         self.connection_check_timer.timeout.connect(self.check_connection)
         self.connection_check_timer.start(60000)  # Check connection every minute
+        self.settle_timer = QtCore.QTimer(self)
+        self.settle_timer.timeout.connect(self.settling.check)
+        self.settle_timer.start(self.settling.check_interval())
+        self.coalesce_timer = QtCore.QTimer(self)
+        self.coalesce_timer.timeout.connect(self.process_event_queue)
+        self.coalesce_timer.start(100)
 
     # Event handlers
     def on_created(self, event):
-        if not event.is_directory:
-            self.queue_event('created', event.src_path)
+        self.queue_event('created', event.src_path, event.is_directory)
 
     def on_modified(self, event):
+        # A directory's mtime changes with its entries, those have events of their own
         if not event.is_directory:
             self.queue_event('modified', event.src_path)
 
     def on_deleted(self, event):
-        if not event.is_directory:
-            self.queue_event('deleted', event.src_path)
+        self.queue_event('deleted', event.src_path, event.is_directory)
 
     def on_moved(self, event):
+        self.queue_event('moved', (event.src_path, event.dest_path), event.is_directory)
+
+    def on_closed(self, event):
+        # IN_CLOSE_WRITE where the platform reports it, the writer is done with the file
         if not event.is_directory:
-            self.queue_event('moved', (event.src_path, event.dest_path))
+            self.settling.closed(event.src_path)
+
+    def queue_event(self, event_type, path, is_directory=False):
+        if isinstance(path, tuple):
+            self.journal('move_folder' if is_directory else 'move', path[1], 'pending', source_path=path[0])
+        elif event_type == 'deleted':
+            self.journal('delete_folder' if is_directory else 'delete', path, 'pending')
+        elif is_directory:
+            self.journal('create_folder', path, 'pending')
+        else:
+            self.journal('upload', path, 'pending')  # Held until the file settles, a crash meanwhile must not lose it
+        self.coalescer.add(event_type, path, is_directory)
+
+    def journal(self, operation, local_path, state, source_path='', error=''):
+        transfer_journal.record(self.ftp_host, self.local_folder, self.remote_folder, operation, local_path, state, source_path, error)
 
-    def queue_event(self, event_type, path):
-        self.event_queue.append((event_type, path))
-        self.process_event_signal.emit()
+    def journal_done(self, local_path):
+        transfer_journal.complete(self.ftp_host, self.remote_folder, local_path)
+
+    def replay_journal(self):
+        # Operations a crash or an earlier stop left unfinished, re-queued unless the local state made them moot
+        entries = transfer_journal.unfinished(self.ftp_host, self.local_folder, self.remote_folder)
+        if not entries:
+            return
+        self.log_signal.emit(f"Replaying {len(entries)} unfinished operations from the transfer journal")
+        for operation, local_path, source_path, state in entries:
+            if operation == 'upload' and os.path.isfile(local_path):
+                # Interrupted transfers go first, they continue from their resume point
+                self.queue_upload(local_path, front=state == 'in_flight')
+            elif operation == 'delete' and not os.path.exists(local_path):
+                self.queue_event('deleted', local_path)
+            elif operation == 'move' and os.path.exists(local_path):
+                self.queue_event('moved', (source_path, local_path))
+            elif operation == 'create_folder' and os.path.isdir(local_path):
+                self.queue_event('created', local_path, True)
+            elif operation == 'delete_folder' and not os.path.exists(local_path):
+                self.queue_event('deleted', local_path, True)
+            elif operation == 'move_folder' and os.path.isdir(local_path):
+                self.queue_event('moved', (source_path, local_path), True)
+            else:
+                self.journal_done(local_path)
 
     def process_event_queue(self):
-        while self.event_queue:
-            event_type, path = self.event_queue.pop(0)
-            if isinstance(path, tuple):  # For moved events
+        # Runs on a timer, only the net effect of a settled burst of events reaches the server
+        for held in move_detector.due(self):
+            self.finish_held_delete(held)
+        if not self.coalescer.due():
+            return
+        operations, unchanged = self.coalescer.flush()
+        for path in unchanged:
+            self.journal_done(path)
+        for operation, path in operations:
+            if operation == 'delete':
+                self.journal('delete', path, 'pending')
+                self.settling.forget(path)
+                self.cancel_upload(path)
+                self.hold_delete(path)
+            elif operation == 'move':
                 src_path, dest_path = path
-                if src_path not in self.files_in_process and dest_path not in self.files_in_process:
-                    self.files_in_process.add(dest_path)
-                    self.move_remote_file(src_path, dest_path)
-                    self.files_in_process.remove(dest_path)
-            elif path not in self.files_in_process:
-                self.files_in_process.add(path)
-                if event_type in ['created', 'modified']:
-                    self.queue_upload(path)
-                elif event_type == 'deleted':
-                    self.delete_file(path)
-                self.files_in_process.remove(path)
-
-    def queue_upload(self, local_path):
-        try:
-            if local_path not in self.upload_queue:
-                self.upload_queue.append(local_path)
-                self.log_signal.emit(f"Queued file for upload: {local_path}")
-                if not self.uploading:
-                    self.process_next_upload()
-        except Exception as e:
-            self.log_signal.emit(f"Error in queue_upload: {e}")
-
-    def process_next_upload(self):
+                self.finish_replaced_delete(dest_path)
+                self.journal('move', dest_path, 'pending', source_path=src_path)
+                self.settling.move(src_path, dest_path)
+                upload_pending = self.cancel_upload(src_path)
+                self.move_remote_file(src_path, dest_path)
+                if upload_pending:
+                    self.queue_upload(dest_path)
+            elif operation == 'delete_folder':
+                self.journal('delete_folder', path, 'pending')
+                self.cancel_uploads_below(path)
+                self.hold_folder_delete(path)
+            elif operation == 'move_folder':
+                src_path, dest_path = path
+                self.finish_replaced_delete(dest_path)
+                self.journal('move_folder', dest_path, 'pending', source_path=src_path)
+                self.settling.move_folder(src_path, dest_path)
+                moved_uploads = self.cancel_uploads_below(src_path)
+                self.move_remote_folder(src_path, dest_path)
+                for local_path in moved_uploads:
+                    self.queue_upload(dest_path + local_path[len(src_path):])
+            elif operation == 'create_folder':
+                self.journal('create_folder', path, 'pending')
+                self.create_remote_tree(path)
+            else:
+                self.journal('upload', path, 'pending')
+                self.settling.hold(path)
+
+    def hold_delete(self, local_path):
+        # The remote copy stays for a moment, a new file with the same content anywhere on this server takes it over by rename
+        digest = self.file_index.uploaded_digest(local_path)
+        if digest is None or move_detector.window <= 0:
+            self.delete_file(local_path)
+            return
+        remote_path = self.get_remote_path(local_path)
+        move_detector.hold(self, local_path, remote_path, False, [(digest, remote_path)])
+
+    def hold_folder_delete(self, local_folder):
+        files = [(local_path, self.file_index.uploaded_digest(local_path)) for local_path in self.file_index.below(local_folder)]
+        files = [(local_path, digest) for local_path, digest in files if digest is not None]
+        if not files or move_detector.window <= 0:
+            self.delete_remote_folder(local_folder)
+            return
+        # The folder's name is freed at once by renaming it aside, its files stay claimable until it is removed
+        remote_path = self.get_remote_path(local_folder)
+        directory, separator, name = remote_path.rpartition('/')
+        aside_path = f"{directory}{separator}.{name}.{time.time_ns()}{deleted_folder_suffix}"
         try:
-            if self.upload_queue and not self.uploading:
-                self.uploading = True
-                local_path = self.upload_queue.popleft()
-                self.upload_file(local_path)
+            self.ftp.rename(remote_path, aside_path)
+        except ftplib.error_perm as e:
+            if str(e).startswith('550'):
+                self.file_index.forget_folder(local_folder)
+                self.journal_done(local_folder)  # Nothing left to delete
+                return
+            self.delete_remote_folder(local_folder)
+            return
+        except Exception as e:
+            self.journal('delete_folder', local_folder, 'failed', error=str(e))
+            self.log_signal.emit(f"Error in hold_folder_delete: {e}")
+            return
+        self.remote_directories.invalidate(remote_path)
+        self.file_index.forget_folder(local_folder)
+        prefix = len(local_folder.rstrip(os.sep))
+        candidates = [(digest, aside_path + local_path[prefix:].replace(os.sep, '/')) for local_path, digest in files]
+        move_detector.hold(self, local_folder, aside_path, True, candidates)
+
+    def finish_replaced_delete(self, local_path):
+        # Deletes still go before the renames that reuse their names, some servers refuse to rename onto an existing file
+        for held in move_detector.take(self, local_path):
+            self.delete_file(held.local_path)
+
+    def finish_held_delete(self, held):
+        if not held.folder:
+            if os.path.exists(held.local_path):
+                # Recreated or renamed onto since, its remote name belongs to the new file now
+                self.journal_done(held.local_path)
             else:
-                self.uploading = False
+                self.delete_file(held.local_path)
+            return
+        try:
+            self.remove_directory_recursive(held.remote_path)
+            self.journal_done(held.local_path)
+            self.log_signal.emit(f"Deleted remote folder: {self.get_remote_path(held.local_path)}")
         except Exception as e:
-            self.log_signal.emit(f"Error in process_next_upload: {e}")
-            self.uploading = False
+            self.journal('delete_folder', held.local_path, 'failed', error=str(e))
+            self.log_signal.emit(f"Error removing {held.remote_path}: {e}")
 
-    def upload_file(self, local_path, retries=3):
-        if not self.ensure_connection():
-            self.log_signal.emit(f"Failed to upload {local_path} due to connection issues.")
-            self.uploading = False
-            self.process_next_upload()
+    def create_remote_tree(self, src_path):
+        # A new directory arrives with whatever was created or moved into it, one scan finds all of it
+        if not self.create_remote_folder(src_path):
             return
-
+        for directory, subdirectories, files in os.walk(src_path):
+            for name in subdirectories:
+                self.create_remote_folder(os.path.join(directory, name))
+            for name in files:
+                local_path = os.path.join(directory, name)
+                self.journal('upload', local_path, 'pending')
+                self.settling.hold(local_path)
+        self.journal_done(src_path)
+
+    def queue_upload(self, local_path, front=False):
         try:
-            relative_path = os.path.relpath(local_path, self.local_folder)
-            remote_path = os.path.join(self.remote_folder, relative_path).replace('\\', '/')
-            self.log_signal.emit(f"Uploading file: Local Path: {local_path}, Relative Path: {relative_path}, Remote Path: {remote_path}")
-
-            if not self.quickconnect_in_use and self.file_exists(remote_path):
-                reply = QtWidgets.QMessageBox.question(None, 'Confirm Overwrite', f'File {remote_path} already exists. Do you want to overwrite it?', QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No)
-                if reply == QtWidgets.QMessageBox.No:
-                    self.log_signal.emit(f"File overwrite canceled: {remote_path}")
-                    self.uploading = False
-                    self.process_next_upload()
-                    return
+            with self.upload_condition:
+                if local_path in self.uploads_in_progress:
+                    # Upload it again once the running transfer of the older content is done
+                    self.requeue_after_upload.add(local_path)
+                elif local_path not in self.queued_uploads:
+                    task = FTPManagerUploadTask(local_path)
+                    self.queued_uploads[local_path] = task
+                    self.upload_queue.push(task, front)
+                    self.log_signal.emit(f"Queued file for upload: {local_path}")
+                    upload_pool.wake()
+                elif front and not self.upload_queue.prioritise(local_path):
+                    # Backing off in the retry heap, the task is sent next instead of when its delay runs out
+                    task = self.queued_uploads[local_path]
+                    self.retry_queue = [entry for entry in self.retry_queue if entry[2] is not task]
+                    heapq.heapify(self.retry_queue)
+                    task.due = 0.0
+                    self.upload_queue.push(task, True)
+                    upload_pool.wake()
+                self.journal('upload', local_path, 'pending')
+        except Exception as e:
+            self.log_signal.emit(f"Error in queue_upload: {e}")
 
-            with open(local_path, 'rb') as file:
-                self.ftp.storbinary(f'STOR {remote_path}', file)
+    def cancel_upload(self, local_path):
+        """ Drop a queued or backing off upload, returns whether there was one """
+        with self.upload_condition:
+            self.requeue_after_upload.discard(local_path)
+            task = self.queued_uploads.pop(local_path, None)
+            if task is None:
+                return False
+            # A task waiting in the retry heap is skipped when it comes due
+            self.upload_queue.cancel(local_path)
+            return True
 
-            local_size = os.path.getsize(local_path)
-            remote_size = self.ftp.size(remote_path)
+    def cancel_uploads_below(self, local_folder):
+        """ Drop the queued uploads inside a folder, returns the paths of those that were queued or running """
+        prefix = local_folder.rstrip(os.sep) + os.sep
+        with self.upload_condition:
+            running = [local_path for local_path in self.uploads_in_progress if local_path.startswith(prefix)]
+            queued = [local_path for local_path in self.queued_uploads if local_path.startswith(prefix)]
+            for local_path in queued:
+                self.cancel_upload(local_path)
+            self.requeue_after_upload.difference_update(running)
+        return queued + running
+
+    def stop_uploads(self):
+        # A worker waiting for an overwrite answer or sending a large file gives up on it, the journal keeps the task
+        with self.upload_condition:
+            self.uploads_stopped = True
+            self.stopping.set()
+            while self.uploads_in_progress:
+                self.upload_condition.wait()
+        upload_pool.unregister(self)
+
+    def shutdown(self):
+        # Runs on the observer thread, the timers stop before close() gives the connection back
+        for timer in self.findChildren(QtCore.QTimer):
+            timer.stop()
+        QtCore.QThread.currentThread().quit()
+
+    def close(self):
+        # Called on the observer thread once its event loop has ended, no timer can use self.ftp any more
+        for timer in self.findChildren(QtCore.QTimer):
+            timer.stop()
+        self.stop_uploads()
+        # Nothing can claim the held deletes any more
+        for held in move_detector.release(self):
+            self.finish_held_delete(held)
+        self.ftp_lease.release()
+        self.ftp = None
+        transfer_tuner.save(self.ftp_host, self.quick_connect_id, self.log_signal.emit)
+        # Queued and interrupted uploads stay in the journal for the next start
+        transfer_journal.flush()
+        file_index_store.flush()
+        directory_index_store.flush()
+        # Folder summaries now describe everything the server was sent, the next start may trust them
+        self.directory_index.mark_clean()
+
+    def take_upload(self, now):
+        """ Called by the upload pool with its condition held, returns a ready task or None and when the next retry is due """
+        if self.uploads_stopped or len(self.uploads_in_progress) >= self.upload_connections:
+            return None, None
+        while self.retry_queue and self.retry_queue[0][0] <= now:
+            task = heapq.heappop(self.retry_queue)[2]
+            if self.queued_uploads.get(task.local_path) is task:
+                self.upload_queue.push(task)
+        if not self.upload_queue:
+            return None, self.retry_queue[0][0] if self.retry_queue else None
+        task = self.upload_queue.pop()
+        del self.queued_uploads[task.local_path]
+        self.uploads_in_progress.add(task.local_path)
+        self.journal('upload', task.local_path, 'in_flight')
+        return task, None
+
+    def retry_upload(self, task, error):
+        # Put a failed task back with a due time so the workers keep serving other files meanwhile
+        error_class = upload_retry_scheduler.classify(error)
+        task.attempts += 1
+        delay = upload_retry_scheduler.delay(error_class, task.attempts)
+        if delay is None:
+            self.log_signal.emit(f"Failed to upload {task.local_path} after {task.attempts} attempts: {error}")
+            self.journal('upload', task.local_path, 'failed', error=str(error))
+            return False
+        self.log_signal.emit(f"Upload of {task.local_path} failed ({error_class}: {error}), retrying in {delay:.1f} seconds")
+        with self.upload_condition:
+            if task.local_path not in self.queued_uploads:
+                task.due = time.monotonic() + delay
+                self.queued_uploads[task.local_path] = task
+                heapq.heappush(self.retry_queue, (task.due, next(self.retry_sequence), task))
+                self.journal('upload', task.local_path, 'pending', error=str(error))
+                # Waiting workers recompute how long to sleep
+                self.upload_condition.notify_all()
+        return True
+
+    def upload_finished(self, task):
+        with self.upload_condition:
+            self.uploads_in_progress.discard(task.local_path)
+            if task.local_path in self.requeue_after_upload:
+                self.requeue_after_upload.discard(task.local_path)
+                # A pending retry uploads the newest content anyway
+                if task.local_path not in self.queued_uploads:
+                    new_task = FTPManagerUploadTask(task.local_path)
+                    self.queued_uploads[task.local_path] = new_task
+                    self.upload_queue.push(new_task)
+                self.journal('upload', task.local_path, 'pending')
+            # Wakes stop_uploads() and the threads holding back while this folder used all its connections
+            self.upload_condition.notify_all()
+
+    def get_remote_path(self, local_path):
+        relative_path = os.path.relpath(local_path, self.local_folder)
+        return os.path.join(self.remote_folder, relative_path).replace('\\', '/')
 
-            if local_size == remote_size:
-                self.log_signal.emit(f"Upload confirmed: {local_path} to {remote_path}")
-                self.uploading = False
-                self.process_next_upload()
-            else:
-                self.log_signal.emit(f"Size mismatch after upload: {local_path} to {remote_path} (local: {local_size}, remote: {remote_size})")
-                if retries > 0:
-                    self.log_signal.emit(f"Retrying upload: {local_path} to {remote_path} (remaining retries: {retries})")
-                    time.sleep(5)  # Wait for 5 seconds before retrying
-                    self.upload_file(local_path, retries - 1)
-                else:
-                    self.log_signal.emit(f"Failed to upload {local_path} to {remote_path} after multiple attempts.")
-                    self.uploading = False
-                    self.process_next_upload()
+    def get_upload_path(self, remote_path):
+        # Where the bytes are written, a hidden sibling of the target when uploads are published atomically
+        if not self.atomic_uploads:
+            return remote_path
+        directory, separator, name = remote_path.rpartition('/')
+        return f"{directory}{separator}.{name}{atomic_upload_suffix}"
 
-        except ftplib.all_errors as e:
-            self.log_signal.emit(f'FTP error during upload: {e}')
-            if retries > 0:
-                self.log_signal.emit(f"Retrying upload: {local_path} to {remote_path} (remaining retries: {retries})")
-                time.sleep(5)  # Wait for 5 seconds before retrying
-                self.upload_file(local_path, retries - 1)
-            else:
-                self.log_signal.emit(f"Failed to upload {local_path} to {remote_path} after multiple attempts.")
-                self.uploading = False
-                self.process_next_upload()
+    def confirm_overwrite(self, remote_path):
+        # Called from upload workers, the dialog itself has to run on the GUI thread
+        return overwrite_prompt.confirm(remote_path, self.stopping)
 
     def on_upload_complete(self, local_path, remote_path, success):
         try:
             if success:
                 self.log_signal.emit(f"Upload completed: {local_path} to {remote_path}")
-                QtCore.QTimer.singleShot(1000, lambda: self.verify_upload(local_path, remote_path))
             else:
                 self.log_signal.emit(f"Upload failed: {local_path} to {remote_path}")
-                self.uploading = False
-                self.process_next_upload()
         except Exception as e:
             self.log_signal.emit(f"Error in on_upload_complete: {e}")
-            self.uploading = False
-            self.process_next_upload()
-
-    def verify_upload(self, local_path, remote_path, retries=5):
-        try:
-            if self.file_exists(remote_path):
-                self.log_signal.emit(f"Verified upload: {local_path} exists on the server at {remote_path}")
-                self.uploading = False
-                self.process_next_upload()
-            else:
-                if retries > 0:
-                    self.log_signal.emit(f"File not found on server, retrying... ({retries} attempts left)")
-                    QtCore.QTimer.singleShot(1000, lambda: self.verify_upload(local_path, remote_path, retries - 1))
-                else:
-                    self.log_signal.emit(f"Failed to verify upload: {local_path} does not exist on the server at {remote_path}")
-                    self.uploading = False
-                    self.process_next_upload()
-        except Exception as e:
-            self.log_signal.emit(f"Error verifying upload: {e}")
-            self.uploading = False
-            self.process_next_upload()
 
     def file_exists(self, remote_path):
         if not self.ensure_connection():
@@ -2113,118 +4460,1410 @@ class FTPManagerFTPEventHandlerWrapper(QtCore.QObject, FileSystemEventHandler):
         try:
             relative_path = os.path.relpath(src_path, self.local_folder)
             remote_path = os.path.join(self.remote_folder, relative_path).replace('\\', '/')
-            self.ftp.mkd(remote_path)
-            self.log_signal.emit(f"Created remote directory: {remote_path}")
+            self.remote_directories.ensure(self.ftp, remote_path, self.log_signal.emit)
+            return True
         except ftplib.error_perm as e:
-            if not str(e).startswith('550'):  # 550 error means directory already exists
-                self.log_signal.emit(f"Error creating remote directory: {e}")
+            self.journal('create_folder', src_path, 'failed', error=str(e))
+            self.log_signal.emit(f"Error creating remote directory: {e}")
         except Exception as e:
+            self.journal('create_folder', src_path, 'failed', error=str(e))
             self.log_signal.emit(f"Error in create_remote_folder: {e}")
+        return False
 
     def delete_file(self, src_path):
         try:
             relative_path = os.path.relpath(src_path, self.local_folder)
             remote_path = os.path.join(self.remote_folder, relative_path).replace('\\', '/')
             self.ftp.delete(remote_path)
+            self.file_index.forget(src_path)
+            self.journal_done(src_path)
             self.log_signal.emit(f"Deleted remote file: {remote_path}")
         except ftplib.error_perm as e:
+            if str(e).startswith('550'):
+                self.file_index.forget(src_path)
+                self.journal_done(src_path)  # Nothing left to delete
+            else:
+                self.journal('delete', src_path, 'failed', error=str(e))
             self.log_signal.emit(f"Error deleting remote file: {e}")
         except Exception as e:
+            self.journal('delete', src_path, 'failed', error=str(e))
             self.log_signal.emit(f"Error in delete_file: {e}")
 
     def delete_remote_folder(self, src_path):
         try:
             relative_path = os.path.relpath(src_path, self.local_folder)
             remote_path = os.path.join(self.remote_folder, relative_path).replace('\\', '/')
+            self.remote_directories.invalidate(remote_path)
             self.remove_directory_recursive(remote_path)
+            self.file_index.forget_folder(src_path)
+            self.journal_done(src_path)
             self.log_signal.emit(f"Deleted remote folder: {remote_path}")
+        except ftplib.error_perm as e:
+            if str(e).startswith('550'):
+                self.file_index.forget_folder(src_path)
+                self.journal_done(src_path)  # Nothing left to delete
+            else:
+                self.journal('delete_folder', src_path, 'failed', error=str(e))
+            self.log_signal.emit(f"Error deleting remote folder: {e}")
         except Exception as e:
+            self.journal('delete_folder', src_path, 'failed', error=str(e))
             self.log_signal.emit(f"Error in delete_remote_folder: {e}")
 
-    def remove_directory_recursive(self, path):
+    def remove_directory_recursive(self, path):
+        # List the whole tree first, then delete the files over as many connections as the uploads use
+        directories = [path]
+        files = []
+        pending = deque([path])
+        while pending:
+            directory = pending.popleft()
+            for name, properties in self.ftp.mlsd(directory, facts=['type']):
+                entry_type = properties.get('type', '').lower()
+                if entry_type in ('cdir', 'pdir') or name in ('.', '..'):
+                    continue
+                if entry_type == 'dir':
+                    directories.append(f"{directory}/{name}")
+                    pending.append(f"{directory}/{name}")
+                else:
+                    files.append(f"{directory}/{name}")
+
+        remaining = deque(files)
+        errors = []
+        def delete_files(ftp):
+            while remaining and not errors:
+                try:
+                    remote_path = remaining.popleft()
+                except IndexError:
+                    break
+                try:
+                    ftp.delete(remote_path)
+                except ftplib.error_perm as e:
+                    if not str(e).startswith('550'):
+                        errors.append(e)
+                except Exception as e:
+                    errors.append(e)
+
+        def delete_with_pooled_connection():
+            # Helpers are best effort, when the pool is exhausted by the upload workers the others carry on without them
+            try:
+                lease = ftp_connection_pool.acquire(self.ftp_host, self.ftp_user, self.ftp_pass, timeout=5)
+            except Exception:
+                return
+            with lease:
+                delete_files(lease.ftp)
+
+        helpers = [threading.Thread(target=delete_with_pooled_connection, name="RemoteFolderDelete", daemon=True)
+                   for _ in range(min(self.upload_connections, len(files) // 100))]
+        for helper in helpers:
+            helper.start()
+        delete_files(self.ftp)
+        for helper in helpers:
+            helper.join()
+        if errors:
+            raise errors[0]
+        for directory in reversed(directories):
+            self.ftp.rmd(directory)
+        self.log_signal.emit(f"Removed {len(files)} files and {len(directories)} folders below {path}")
+
+    def move_remote_folder(self, src_path, dest_path):
+        try:
+            relative_src = os.path.relpath(src_path, self.local_folder)
+            relative_dest = os.path.relpath(dest_path, self.local_folder)
+            remote_src = os.path.join(self.remote_folder, relative_src).replace('\\', '/')
+            remote_dest = os.path.join(self.remote_folder, relative_dest).replace('\\', '/')
+            self.remote_directories.ensure(self.ftp, posixpath.dirname(remote_dest), self.log_signal.emit)
+            self.ftp.rename(remote_src, remote_dest)
+            self.remote_directories.invalidate(remote_src)
+            self.remote_directories.add(remote_dest)
+            self.file_index.move_folder(src_path, dest_path)
+            self.journal_done(dest_path)
+            self.log_signal.emit(f"Moved remote folder: {remote_src} to {remote_dest}")
+        except Exception as e:
+            self.journal('move_folder', dest_path, 'failed', source_path=src_path, error=str(e))
+            self.log_signal.emit(f"Error in move_remote_folder: {e}")
+
+    def move_remote_file(self, src_path, dest_path):
+        try:
+            relative_src = os.path.relpath(src_path, self.local_folder)
+            relative_dest = os.path.relpath(dest_path, self.local_folder)
+            remote_src = os.path.join(self.remote_folder, relative_src).replace('\\', '/')
+            remote_dest = os.path.join(self.remote_folder, relative_dest).replace('\\', '/')
+            self.remote_directories.ensure(self.ftp, posixpath.dirname(remote_dest), self.log_signal.emit)
+            self.ftp.rename(remote_src, remote_dest)
+            self.file_index.move(src_path, dest_path)
+            self.journal_done(dest_path)
+            self.log_signal.emit(f"Moved remote file: {remote_src} to {remote_dest}")
+        except Exception as e:
+            self.journal('move', dest_path, 'failed', source_path=src_path, error=str(e))
+            self.log_signal.emit(f"Error in move_remote_file: {e}")
+
+class FTPManagerDirectoryIndexStore(FTPManagerBatchWriter):
+    """ Persists the folder summaries of every monitored mapping in the directory_index table """
+
+    def save(self, host, local_folder, remote_folder, directory, summary):
+        mtime_ns, digest, subdirectories, recorded_ns = summary
+        self.queue_write((host, remote_folder, directory), (host, local_folder, remote_folder, directory, mtime_ns, digest, '\n'.join(subdirectories), recorded_ns))
+
+    def remove(self, host, remote_folder, directory):
+        self.queue_write((host, remote_folder, directory), None)
+
+    def load(self, host, local_folder, remote_folder):
+        return self.read('SELECT directory, mtime_ns, digest, subdirectories, recorded_ns FROM directory_index WHERE host=? AND local_folder=? AND remote_folder=?',
+                         (host, local_folder, remote_folder),
+                         lambda rows: {row[0]: (row[1], row[2], tuple(row[3].split('\n')) if row[3] else (), row[4]) for row in rows})
+
+directory_index_store = FTPManagerDirectoryIndexStore(
+    'directory_index', ('host', 'remote_folder', 'directory'),
+    ('host', 'local_folder', 'remote_folder', 'directory', 'mtime_ns', 'digest', 'subdirectories', 'recorded_ns')
+)
+
+class FTPManagerDirectoryIndex:
+    """ Per folder mtime, child digest and subfolder names of a mapping, so a catch-up scan only lists folders that changed """
+
+    def __init__(self, host, local_folder, remote_folder):
+        self.host = host
+        self.local_folder = local_folder
+        self.remote_folder = remote_folder
+        self.summaries = directory_index_store.load(host, local_folder, remote_folder)  # Relative folder -> (mtime_ns, digest, subfolders, recorded_ns)
+        # Summaries only cover what happened before the last stop when that stop was clean, after a crash everything is scanned
+        clean = self.set_clean_shutdown(False)
+        self.trusted = clean and bool(self.summaries)
+        self.reconciled = False  # Whether a start-up scan finished and recorded its summaries this session
+
+    def set_clean_shutdown(self, clean):
+        """ Store the flag and return its previous value """
+        try:
+            conn = sqlite3.connect(master_db_file)
+            c = conn.cursor()
+            c.execute('SELECT clean_shutdown FROM monitor_sessions WHERE host=? AND local_folder=? AND remote_folder=?',
+                      (self.host, self.local_folder, self.remote_folder))
+            row = c.fetchone()
+            c.execute('INSERT OR REPLACE INTO monitor_sessions (host, local_folder, remote_folder, clean_shutdown) VALUES (?, ?, ?, ?)',
+                      (self.host, self.local_folder, self.remote_folder, int(clean)))
+            conn.commit()
+            conn.close()
+            return bool(row and row[0])
+        except sqlite3.Error as e:
+            if debug_mode:
+                print(f"SQLite error: {e.args[0]} while updating the monitor session of {self.local_folder}")
+            return False
+
+    def mark_clean(self):
+        # Without a finished start-up scan the summaries may predate changes nobody queued
+        if self.reconciled:
+            self.set_clean_shutdown(True)
+
+    def digest(self, names, subdirectories):
+        hasher = hashlib.sha1()
+        for name in sorted(names):
+            hasher.update(name.encode('utf-8', 'surrogateescape') + b'\0')
+        return f"{len(names)}:{len(subdirectories)}:{hasher.hexdigest()}"
+
+    def unchanged(self, directory, path):
+        """ The subfolder names of an unchanged folder, None when it has to be listed again """
+        summary = self.summaries.get(directory)
+        if summary is None:
+            return None
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            self.forget(directory)
+            return ()
+        if mtime_ns != summary[0] or summary[3] - mtime_ns < directory_mtime_granularity * 1000000000:
+            return None
+        return summary[2]
+
+    def update(self, scanned, visited=None):
+        """ Record the summaries a finished scan collected, visited holds every folder it saw when it was a full scan """
+        for directory, mtime_ns, digest, subdirectories, listed_ns in scanned:
+            self.record(directory, mtime_ns, digest, subdirectories, listed_ns)
+        if visited is not None:
+            self.retain(visited)
+        self.reconciled = True
+
+    def record(self, directory, mtime_ns, digest, subdirectories, listed_ns):
+        previous = self.summaries.get(directory)
+        if previous is not None:
+            # Subfolders that are gone take their summaries with them
+            for name in set(previous[2]) - set(subdirectories):
+                self.forget(f"{directory}/{name}" if directory else name)
+            if previous[0] == mtime_ns and previous[1] == digest and previous[3] - mtime_ns >= directory_mtime_granularity * 1000000000:
+                return
+        summary = (mtime_ns, digest, tuple(subdirectories), listed_ns)
+        self.summaries[directory] = summary
+        directory_index_store.save(self.host, self.local_folder, self.remote_folder, directory, summary)
+
+    def forget(self, directory):
+        prefix = f"{directory}/"
+        for known in [known for known in self.summaries if known == directory or known.startswith(prefix) or not directory]:
+            del self.summaries[known]
+            directory_index_store.remove(self.host, self.remote_folder, known)
+
+    def retain(self, directories):
+        # After a full scan, summaries of folders that no longer exist are dropped
+        for known in [known for known in self.summaries if known not in directories]:
+            del self.summaries[known]
+            directory_index_store.remove(self.host, self.remote_folder, known)
+
+class FTPManagerHeldDelete:
+    """ A remote delete kept back by the move detector """
+
+    __slots__ = ('handler', 'local_path', 'remote_path', 'folder', 'deadline', 'done', 'candidates')
+
+    def __init__(self, handler, local_path, remote_path, folder, deadline):
+        self.handler = handler
+        self.local_path = local_path
+        self.remote_path = remote_path  # The file itself, or where its folder was renamed aside
+        self.folder = folder
+        self.deadline = deadline
+        self.done = False
+        self.candidates = []  # (key, candidate) pairs still registered with the detector
+
+class FTPManagerMoveCandidate:
+    """ One remote file of a held delete that a new file with the same content may take over """
+
+    __slots__ = ('held', 'remote_path')
+
+    def __init__(self, held, remote_path):
+        self.held = held
+        self.remote_path = remote_path
+
+class FTPManagerMoveDetector:
+    """ Matches new files against recently deleted ones by content hash across all monitors of a server login """
+
+    def __init__(self, window=move_detection_window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.candidates = {}  # (host, username, hash) -> [candidate], oldest first
+        self.held = {}  # handler -> [held delete]
+
+    def hold(self, handler, local_path, remote_path, folder, files):
+        """ Keep a delete back until the window passes, files are its (hash, remote path) pairs """
+        held = FTPManagerHeldDelete(handler, local_path, remote_path, folder, time.monotonic() + self.window)
+        with self.lock:
+            self.held.setdefault(handler, []).append(held)
+            for digest, file_remote_path in files:
+                key = (handler.ftp_host, handler.ftp_user, digest)
+                candidate = FTPManagerMoveCandidate(held, file_remote_path)
+                self.candidates.setdefault(key, []).append(candidate)
+                held.candidates.append((key, candidate))
+        return held
+
+    def finish(self, held):
+        # Called with the lock held: nothing may claim the held delete's files any more
+        held.done = True
+        for key, candidate in held.candidates:
+            candidates = self.candidates.get(key)
+            if candidates and candidate in candidates:
+                candidates.remove(candidate)
+                if not candidates:
+                    del self.candidates[key]
+        held.candidates = []
+
+    def claim(self, host, username, digest):
+        """ Take the oldest matching candidate whose delete is still held, None if there is none """
+        key = (host, username, digest)
+        with self.lock:
+            candidates = self.candidates.get(key)
+            while candidates:
+                candidate = candidates.pop(0)
+                if not candidate.held.done:
+                    break
+            else:
+                candidate = None
+            if not candidates:
+                self.candidates.pop(key, None)
+            return candidate
+
+    def moved(self, candidate):
+        # A single file that was renamed away needs no delete any more, a folder is still removed with what is left in it
+        held = candidate.held
+        if held.folder:
+            return
+        with self.lock:
+            if held.done:
+                return
+            self.finish(held)
+            self.held[held.handler].remove(held)
+        held.handler.file_index.forget(held.local_path)
+        held.handler.journal_done(held.local_path)
+
+    def due(self, handler):
+        """ The handler's held deletes whose window has passed, they are its to carry out now """
+        now = time.monotonic()
+        with self.lock:
+            held_deletes = self.held.get(handler)
+            if not held_deletes or held_deletes[0].deadline > now:
+                return []
+            due = [held for held in held_deletes if held.deadline <= now]
+            self.held[handler] = [held for held in held_deletes if held.deadline > now]
+            for held in due:
+                self.finish(held)
+            return due
+
+    def take(self, handler, local_path):
+        """ The handler's held delete of the file local_path, taken out of the window so it can be carried out now """
+        with self.lock:
+            held_deletes = self.held.get(handler, [])
+            taken = [held for held in held_deletes if held.local_path == local_path and not held.folder]
+            for held in taken:
+                held_deletes.remove(held)
+                self.finish(held)
+            return taken
+
+    def release(self, handler):
+        """ Everything the handler still holds, for when it stops """
+        with self.lock:
+            held_deletes = self.held.pop(handler, [])
+            for held in held_deletes:
+                self.finish(held)
+            return held_deletes
+
+move_detector = FTPManagerMoveDetector()
+
+class FTPManagerEventCoalescer:
+    """ Folds the file and directory events of a burst into the net operations that bring the server up to date """
+
+    def __init__(self, window=event_coalesce_window, max_delay=event_coalesce_max_delay):
+        self.window = window
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # Origins are paths at the start of the burst, None for what was created since
+        self.files = {}  # Current path -> [origin, content written]
+        self.directories = {}  # Current path -> origin, for directories created or moved
+        self.deleted = set()  # Origins of files that are gone
+        self.deleted_directories = set()  # Origins of directories that are gone
+        self.moved_directories = {}  # Source -> destination, the move events watchdog repeats for their children are echoes
+        self.touched = set()
+        self.first_event = None
+        self.last_event = None
+
+    def below(self, path, directory):
+        return path.startswith(directory.rstrip(os.sep) + os.sep)
+
+    def ancestors(self, path):
+        parent = os.path.dirname(path)
+        while parent and parent != path:
+            yield parent
+            path, parent = parent, os.path.dirname(parent)
+
+    def origin(self, path):
+        """ Where path was at the start of the burst, following the directory moves made since """
+        for directory in self.ancestors(path):
+            if directory in self.directories:
+                origin = self.directories[directory]
+                return None if origin is None else origin + path[len(directory):]
+        return path
+
+    def is_echo(self, src_path, dest_path):
+        for directory in self.ancestors(src_path):
+            if directory in self.moved_directories:
+                return dest_path == self.moved_directories[directory] + src_path[len(directory):]
+        return False
+
+    def add(self, event_type, path, is_directory=False):
+        with self.lock:
+            now = time.monotonic()
+            if self.first_event is None:
+                self.first_event = now
+            self.last_event = now
+            if event_type == 'moved':
+                self.touched.update(path)
+                if not self.is_echo(*path):
+                    if is_directory:
+                        self.move_directory(*path)
+                    else:
+                        self.move_file(*path)
+                return
+            self.touched.add(path)
+            if is_directory:
+                if event_type == 'deleted':
+                    self.delete_directory(path)
+                elif event_type == 'created' and path not in self.directories:
+                    self.directories[path] = None
+            elif event_type == 'deleted':
+                origin = self.files.pop(path)[0] if path in self.files else self.origin(path)
+                if origin is not None:
+                    self.deleted.add(origin)
+            elif path in self.files:
+                self.files[path][1] = True
+            else:
+                origin = self.origin(path)
+                if event_type == 'created' and origin not in self.deleted:
+                    origin = None
+                else:
+                    # Modified, or deleted and written again, which is a plain modification
+                    self.deleted.discard(origin)
+                self.files[path] = [origin, True]
+
+    def move_file(self, src_path, dest_path):
+        entry = self.files.pop(src_path, None) or [self.origin(src_path), False]
+        replaced = self.files.pop(dest_path, None)
+        if replaced and replaced[0] is not None and replaced[0] != self.origin(dest_path):
+            # The file renamed over still sits under its original name remotely
+            self.deleted.add(replaced[0])
+        self.files[dest_path] = entry
+
+    def move_directory(self, src_path, dest_path):
+        origin = self.directories.pop(src_path) if src_path in self.directories else self.origin(src_path)
+        for entries in (self.files, self.directories):
+            for path in [path for path in entries if self.below(path, src_path)]:
+                entries[dest_path + path[len(src_path):]] = entries.pop(path)
+        self.directories[dest_path] = origin
+        self.moved_directories[src_path] = dest_path
+
+    def delete_directory(self, path):
+        origin = self.directories.pop(path) if path in self.directories else self.origin(path)
+        # What was moved into the directory during the burst is still at its origin remotely
+        for entries, deleted in ((self.files, self.deleted), (self.directories, self.deleted_directories)):
+            for child in [child for child in entries if self.below(child, path)]:
+                child_origin = entries.pop(child)
+                if isinstance(child_origin, list):
+                    child_origin = child_origin[0]
+                if child_origin is not None and (origin is None or not self.below(child_origin, origin)):
+                    deleted.add(child_origin)
+        if origin is not None:
+            self.deleted_directories.add(origin)
+
+    def due(self):
+        with self.lock:
+            if self.first_event is None:
+                return False
+            now = time.monotonic()
+            return now - self.last_event >= self.window or now - self.first_event >= self.max_delay
+
+    def flush(self):
+        """ ([(operation, path)], unchanged paths) in the order they have to reach the server """
+        with self.lock:
+            files, directories, touched = self.files, self.directories, self.touched
+            deleted, deleted_directories = self.deleted, self.deleted_directories
+            self.reset()
+
+        directory_renames = {origin: path for path, origin in directories.items() if origin is not None and origin != path}
+        created_directories = [path for path, origin in directories.items() if origin is None]
+
+        def locate(path, renames):
+            # Where an origin is once the given directory renames are done, the deepest renamed ancestor wins
+            if path in renames:
+                return renames[path]
+            for directory in self.ancestors(path):
+                if directory in renames:
+                    return renames[directory] + path[len(directory):]
+            return path
+
+        def under_any(path, directories):
+            return any(directory in directories for directory in self.ancestors(path))
+
+        # Files inside new directories are picked up by the directory scan
+        uploads = [path for path, (origin, written) in files.items() if written and not (origin is None and under_any(path, created_directories))]
+        file_renames = {}
+        for path, (origin, written) in files.items():
+            if origin is None or locate(origin, directory_renames) == path:
+                continue
+            if written:
+                # Written and renamed, one upload to the final name replaces the rename and the old name goes away
+                deleted.add(origin)
+            else:
+                file_renames[path] = origin
+
+        # A name that receives new content is overwritten anyway, everything below a removed directory goes with it
+        upload_set = set(uploads)
+        deleted = {path for path in deleted if locate(path, directory_renames) not in upload_set and not under_any(path, deleted_directories)}
+        deleted_directories = {path for path in deleted_directories if not under_any(path, deleted_directories)}
+        # A removed directory still holding something renamed out of it goes only after the renames
+        rename_origins = list(directory_renames) + list(file_renames.values())
+        deferred = {directory for directory in deleted_directories if any(self.below(origin, directory) for origin in rename_origins)}
+
+        operations = [('delete_folder', path) for path in sorted(deleted_directories - deferred)]
+        operations.extend(('delete', path) for path in sorted(deleted))
+        # Folder renames go shallowest first, each from wherever the renames before it left it
+        done = {}
+        for depth in sorted({origin.count(os.sep) for origin in directory_renames}):
+            level = sorted((origin for origin in directory_renames if origin.count(os.sep) == depth), key=lambda origin: directory_renames[origin].count(os.sep))
+            operations.extend(('move_folder', move) for move in self.order_renames({directory_renames[origin]: locate(origin, done) for origin in level}))
+            done.update((origin, directory_renames[origin]) for origin in level)
+        moves = {path: locate(origin, done) for path, origin in file_renames.items()}
+        operations.extend(('move', move) for move in self.order_renames(moves))
+        operations.extend(('delete_folder', locate(path, done)) for path in sorted(deferred))
+        operations.extend(('create_folder', path) for path in sorted(created_directories) if not under_any(path, created_directories))
+        operations.extend(('upload', path) for path in uploads)
+
+        mentioned = set()
+        for operation, path in operations:
+            mentioned.update(path if isinstance(path, tuple) else (path,))
+        return operations, touched - mentioned
+
+    def order_renames(self, renames):
+        # A rename may only run once no other pending rename still reads its target, cycles go through a temporary name
+        pending = dict(renames)  # Target -> source
+        targets = {source: target for target, source in pending.items()}
+        ready = deque(target for target in pending if target not in targets)
+        while pending:
+            if not ready:
+                target, source = next(iter(pending.items()))
+                temp_path = f"{source}.ftpmanager-move"
+                yield source, temp_path
+                del targets[source]
+                pending[target] = temp_path
+                targets[temp_path] = target
+                ready.append(source)
+                continue
+            target = ready.popleft()
+            source = pending.pop(target)
+            yield source, target
+            del targets[source]
+            if source in pending:
+                ready.append(source)
+
+class FTPManagerQuiescenceDetector:
+    """ Holds written files until their size and mtime stop changing or the writer closes them, then releases each once """
+
+    def __init__(self, interval, release_func):
+        self.interval = interval
+        self.release_func = release_func
+        self.lock = threading.Lock()
+        self.held = {}  # Path -> (size, mtime_ns, time.monotonic() since which they are unchanged)
+        self.closed_files = {}  # Path -> (size, mtime_ns, time.monotonic()) of closes that came before the hold
+
+    def check_interval(self):
+        # Milliseconds between checks, a few per settle interval
+        return int(min(1000, max(100, self.interval * 250)))
+
+    def snapshot(self, path):
+        try:
+            stat = os.stat(path)
+            return stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None, None
+
+    def hold(self, path):
+        if self.interval <= 0:
+            self.release_func(path)
+            return
+        snapshot = self.snapshot(path)
+        with self.lock:
+            closed = self.closed_files.pop(path, None)
+            if closed is None or closed[:2] != snapshot:
+                self.held[path] = snapshot + (time.monotonic(),)
+                return
+        # The writer closed the file before its events were coalesced and it has not changed since
+        self.release_func(path)
+
+    def closed(self, path):
+        with self.lock:
+            held = self.held.pop(path, None) is not None
+            if not held:
+                self.closed_files[path] = self.snapshot(path) + (time.monotonic(),)
+        if held:
+            self.release_func(path)
+
+    def forget(self, path):
+        with self.lock:
+            self.held.pop(path, None)
+
+    def move(self, src_path, dest_path):
+        with self.lock:
+            if self.held.pop(src_path, None) is not None:
+                self.held[dest_path] = self.snapshot(dest_path) + (time.monotonic(),)
+
+    def move_folder(self, src_folder, dest_folder):
+        prefix = src_folder.rstrip(os.sep) + os.sep
+        with self.lock:
+            for path in [path for path in self.held if path.startswith(prefix)]:
+                dest_path = dest_folder + path[len(src_folder):]
+                del self.held[path]
+                self.held[dest_path] = self.snapshot(dest_path) + (time.monotonic(),)
+
+    def check(self):
+        now = time.monotonic()
+        ready = []
+        with self.lock:
+            for path in [path for path, closed in self.closed_files.items() if now - closed[2] > 2 * event_coalesce_max_delay]:
+                del self.closed_files[path]
+            for path, (size, mtime, since) in list(self.held.items()):
+                current = self.snapshot(path)
+                if current != (size, mtime):
+                    self.held[path] = current + (now,)
+                elif now - since >= self.interval:
+                    del self.held[path]
+                    # A file that vanished meanwhile is left to its delete event
+                    if size is not None:
+                        ready.append(path)
+        for path in ready:
+            self.release_func(path)
+
+class FTPManagerRemoteDirectoryCache:
+    """ Remote directories one session knows to exist, missing ones are created on demand """
+
+    def __init__(self, *known):
+        self.lock = threading.Lock()
+        self.known = set()
+        for directory in known:
+            self.add(directory)
+
+    def normalize(self, directory):
+        return posixpath.normpath(directory.replace('\\', '/')) if directory else '.'
+
+    def add(self, directory):
+        with self.lock:
+            self.known.add(self.normalize(directory))
+
+    def ensure(self, ftp, directory, log_func=None):
+        """ Create directory and its unknown parents top-down, returns the number of MKDs sent """
+        directory = self.normalize(directory)
+        missing = []
+        with self.lock:
+            while directory not in self.known and directory not in ('.', '/'):
+                missing.append(directory)
+                directory = posixpath.dirname(directory) or '.'
+        for directory in reversed(missing):
+            try:
+                ftp.mkd(directory)
+                if log_func:
+                    log_func(f"Created remote directory: {directory}")
+            except ftplib.error_perm as e:
+                # 550 (521 on some servers) means it exists already, any other failure shows up on the next command
+                if str(e)[:3] not in ('550', '521'):
+                    raise
+            self.add(directory)
+        return len(missing)
+
+    def invalidate(self, directory):
+        """ Forget directory and everything below it after we removed or renamed it """
+        directory = self.normalize(directory)
+        prefix = directory.rstrip('/') + '/'
+        with self.lock:
+            self.known = {known for known in self.known if known != directory and not known.startswith(prefix)}
+
+class FTPManagerVerificationError(Exception):
+    """ The uploaded file did not match the local one """
+
+class FTPManagerUploadTask:
+    """ A queued upload and its retry state """
+
+    __slots__ = ('local_path', 'attempts', 'due')
+
+    def __init__(self, local_path):
+        self.local_path = local_path
+        self.attempts = 0  # Failed attempts so far
+        self.due = 0.0  # time.monotonic() before which a retry must not start
+
+class FTPManagerTransferQueue:
+    """ FIFO of transfer tasks indexed by local path: O(1) enqueue, dedupe, cancel and reprioritise """
+
+    def __init__(self):
+        self.tasks = OrderedDict()  # Local path -> task, oldest first
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __contains__(self, local_path):
+        return local_path in self.tasks
+
+    def push(self, task, front=False):
+        """ Queue task unless its path is queued already, returns whether it was added """
+        if task.local_path in self.tasks:
+            return False
+        self.tasks[task.local_path] = task
+        if front:
+            self.tasks.move_to_end(task.local_path, last=False)
+        return True
+
+    def pop(self):
+        return self.tasks.popitem(last=False)[1]
+
+    def cancel(self, local_path):
+        return self.tasks.pop(local_path, None)
+
+    def prioritise(self, local_path, front=True):
+        """ Move a queued path to the front, or to the back with front=False """
+        if local_path not in self.tasks:
+            return False
+        self.tasks.move_to_end(local_path, last=not front)
+        return True
+
+class FTPManagerRetryScheduler:
+    """ Exponential backoff with jitter, with the delay and attempt limit chosen by the class of error """
+
+    def __init__(self, policies=upload_retry_policies):
+        self.policies = policies
+
+    def classify(self, error):
+        if isinstance(error, (FTPManagerVerificationError, ftplib.error_reply)):
+            return 'verification'
+        if isinstance(error, ftplib.error_temp):
+            # 421 service closing, 425/426 data connection trouble, the rest are server side conditions
+            return 'connection' if str(error)[:3] in ('421', '425', '426') else 'temporary'
+        if isinstance(error, ftplib.error_perm):
+            return 'permanent'
+        if isinstance(error, (FileNotFoundError, PermissionError, IsADirectoryError)):
+            return 'local'
+        if isinstance(error, (OSError, EOFError, ftplib.error_proto)):
+            return 'connection'
+        return 'permanent'
+
+    def delay(self, error_class, attempts):
+        """ Seconds to wait before the next attempt after the given number of failures, None to give up """
+        first, longest, limit = self.policies.get(error_class, self.policies['permanent'])
+        if attempts >= limit:
+            return None
+        delay = min(longest, first * 2 ** (attempts - 1))
+        # Half fixed and half random so retries of many files do not hit the server together
+        return delay / 2 + random.uniform(0, delay / 2)
+
+upload_retry_scheduler = FTPManagerRetryScheduler()
+
+class FTPManagerUploadPool:
+    """ Upload threads shared by every monitored folder, started on demand and bounded in total """
+
+    def __init__(self, max_workers=upload_pool_workers, idle_timeout=upload_worker_idle_timeout):
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self.condition = threading.Condition()  # Also guards the upload queues of every registered handler
+        self.handlers = []
+        self.next_handler = 0
+        self.workers = 0
+        self.idle_workers = 0
+        self.worker_ids = itertools.count(1)
+
+    def register(self, handler):
+        with self.condition:
+            self.handlers.append(handler)
+
+    def unregister(self, handler):
+        with self.condition:
+            if handler in self.handlers:
+                self.handlers.remove(handler)
+
+    def wake(self):
+        """ Called with the condition held once a task is ready, starts a thread when none is waiting """
+        if self.idle_workers == 0 and self.workers < self.max_workers:
+            self.workers += 1
+            worker = FTPManagerUploadWorker()
+            threading.Thread(target=worker.run, name=f"FTPUpload-{next(self.worker_ids)}", daemon=True).start()
+        self.condition.notify()
+
+    def next_upload(self):
+        """ Blocks for the next (handler, task), returns None once the calling thread should exit """
+        with self.condition:
+            idle_since = time.monotonic()
+            while True:
+                now = time.monotonic()
+                next_due = None
+                # Each search starts after the folder served last so a busy folder cannot starve the others
+                count = len(self.handlers)
+                for offset in range(count):
+                    index = (self.next_handler + offset) % count
+                    task, due = self.handlers[index].take_upload(now)
+                    if task is not None:
+                        self.next_handler = index + 1
+                        return self.handlers[index], task
+                    if due is not None and (next_due is None or due < next_due):
+                        next_due = due
+                idle = now - idle_since
+                # One idle thread stays behind while a backed off task is waiting for its due time
+                if idle >= self.idle_timeout and (next_due is None or self.idle_workers > 0):
+                    self.workers -= 1
+                    return None
+                timeouts = [self.idle_timeout - idle] if idle < self.idle_timeout else []
+                if next_due is not None:
+                    timeouts.append(next_due - now)
+                self.idle_workers += 1
+                self.condition.wait(max(0, min(timeouts)))
+                self.idle_workers -= 1
+
+upload_pool = FTPManagerUploadPool()
+
+class FTPManagerUploadWorker:
+    """ One upload thread of the shared pool, serving whichever monitored folder has a task ready """
+
+    def __init__(self):
+        self.handler = None
+        self.lease = None
+        self.ftp = None
+
+    def run(self):
+        while True:
+            job = upload_pool.next_upload()
+            if job is None:
+                break
+            self.handler, task = job
+            try:
+                self.upload_file(task)
+                self.handler.journal_done(task.local_path)
+            except FTPManagerTransferStopped:
+                # The monitor is stopping, the journal and resume point carry the upload over to the next start
+                self.discard_connection()
+            except Exception as e:
+                if upload_retry_scheduler.classify(e) == 'connection':
+                    self.discard_connection()
+                if not self.handler.retry_upload(task, e):
+                    self.remove_temporary_upload(task.local_path)
+            finally:
+                self.release_connection()
+                self.handler.upload_finished(task)
+
+    def release_connection(self):
+        # Hand the connection back to the pool so it stays warm for the next file or another subsystem
+        if self.lease:
+            self.lease.release()
+        self.lease = None
+        self.ftp = None
+
+    def discard_connection(self):
+        # A connection that failed mid-transfer is closed rather than handed to the next user
+        if self.lease:
+            self.lease.discard()
+        self.lease = None
+        self.ftp = None
+
+    def ensure_connection(self):
+        # A single attempt, a failure propagates and the handler schedules the task again
+        if self.ftp:
+            try:
+                self.ftp.voidcmd("NOOP")
+                return
+            except ftplib.all_errors:
+                pass
+        if self.lease:
+            self.ftp = self.lease.reconnect()
+        else:
+            self.lease = ftp_connection_pool.acquire(self.handler.ftp_host, self.handler.ftp_user, self.handler.ftp_pass)
+            self.ftp = self.lease.ftp
+
+    def remove_temporary_upload(self, local_path):
+        # A task that was given up must not leave its hidden partial file on the server, best effort
+        remote_path = self.handler.get_remote_path(local_path)
+        upload_path = self.handler.get_upload_path(remote_path)
+        if upload_path == remote_path:
+            return
+        try:
+            self.ensure_connection()
+            self.ftp.delete(upload_path)
+        except ftplib.all_errors as e:
+            if not str(e).startswith('550'):
+                self.handler.log_signal.emit(f"Could not remove the temporary upload {upload_path}: {e}")
+        upload_resume_store.clear(self.handler.ftp_host, upload_path)
+
+    def file_exists(self, remote_path):
+        try:
+            self.ftp.size(remote_path)
+            return True
+        except ftplib.error_perm as e:
+            if not str(e).startswith('550'):
+                self.handler.log_signal.emit(f"FTP error checking file existence: {e}")
+            return False
+
+    def upload_file(self, task):
+        """ One attempt at uploading the task's file, failures raise and are retried by the handler """
+        local_path = task.local_path
+        relative_path = os.path.relpath(local_path, self.handler.local_folder)
+        remote_path = self.handler.get_remote_path(local_path)
+        upload_path = self.handler.get_upload_path(remote_path)
+        # Touched or rewritten with the same bytes, the server holds this content already
+        digest = self.handler.file_index.digest(local_path)
+        if digest == self.handler.file_index.uploaded_digest(local_path):
+            self.handler.log_signal.emit(f"Skipping upload of {local_path}, its content is unchanged since it was last uploaded")
+            return
+        if task.attempts == 0:
+            self.handler.log_signal.emit(f"Uploading file: Local Path: {local_path}, Relative Path: {relative_path}, Remote Path: {remote_path}")
+        else:
+            self.handler.log_signal.emit(f"Retrying upload: {local_path} to {remote_path} (attempt {task.attempts + 1})")
+
+        self.ensure_connection()
+        if task.attempts == 0 and not self.handler.quickconnect_in_use and not upload_resume_store.has_partial(self.ftp.host, local_path, upload_path) and self.file_exists(remote_path):
+            if not self.handler.confirm_overwrite(remote_path):
+                self.handler.log_signal.emit(f"File overwrite canceled: {remote_path}")
+                return
+
+        remote_dir = posixpath.dirname(upload_path)
+        self.handler.remote_directories.ensure(self.ftp, remote_dir, self.handler.log_signal.emit)
+        if self.move_deleted_copy(local_path, remote_path, digest):
+            return
+
+        # The file index hashed the file with SHA-256 above, a server offering that is checked against it and the
+        # upload keeps sendfile; other algorithms are hashed while sending, or afterwards for out of order segments
+        method = upload_checksums.method(self.ftp)
+        local_digest = digest if method is not None and method[1] == file_index_algorithm else None
+        try:
+            if self.upload_segmented(local_path, upload_path):
+                if method is not None and local_digest is None:
+                    local_digest = self.segment_digest(local_path, method)
+            else:
+                hasher = upload_checksums.new_hasher(method) if method is not None and local_digest is None else None
+                upload_resume_store.upload_file(self.ftp, local_path, upload_path, self.handler.log_signal.emit, self.handler.throttle, hasher, self.handler.stopping)
+                if hasher is not None:
+                    local_digest = hasher.hexdigest()
+        except ftplib.error_perm:
+            # The directory may have been removed behind our back, the retry creates it again
+            self.handler.remote_directories.invalidate(remote_dir)
+            raise
+
+        if not self.verify_upload(local_path, upload_path, method, local_digest):
+            raise FTPManagerVerificationError(f"Verification of {remote_path} failed")
+        if upload_path != remote_path:
+            self.publish(upload_path, remote_path)
+        # Hashed before sending, a change during the upload fails this comparison next time and uploads again
+        self.handler.file_index.uploaded(local_path, digest)
+        self.handler.log_signal.emit(f"Upload confirmed: {local_path} to {remote_path}")
+
+    def move_deleted_copy(self, local_path, remote_path, digest):
+        # A file deleted a moment ago with the same content is still on the server, renaming it is one command instead of a transfer
+        candidate = move_detector.claim(self.handler.ftp_host, self.handler.ftp_user, digest)
+        if candidate is None:
+            return False
+        source_path = candidate.remote_path
+        try:
+            if source_path != remote_path:
+                self.ftp.rename(source_path, remote_path)
+        except ftplib.error_perm as e:
+            self.handler.log_signal.emit(f"Could not move {source_path} to {remote_path}, uploading instead: {e}")
+            return False
+        move_detector.moved(candidate)
+        self.handler.file_index.uploaded(local_path, digest)
+        self.handler.log_signal.emit(f"Moved remote file: {source_path} to {remote_path}, its content matches {local_path}")
+        return True
+
+    def publish(self, upload_path, remote_path):
+        # One RNFR/RNTO makes the complete file appear at once for consumers watching the folder
         try:
-            for (name, properties) in self.ftp.mlsd(path):
-                if name in ['.', '..']:
-                    continue
-                elif properties['type'] == 'dir':
-                    self.remove_directory_recursive(f"{path}/{name}")
-                else:
-                    self.ftp.delete(f"{path}/{name}")
-            self.ftp.rmd(path)
-        except Exception as e:
-            self.log_signal.emit(f"Error in remove_directory_recursive: {e}")
+            self.ftp.rename(upload_path, remote_path)
+        except ftplib.error_perm as e:
+            # Some servers refuse to rename onto an existing file, replacing it is then no longer atomic
+            if not str(e).startswith('550') or not self.file_exists(remote_path):
+                raise
+            self.handler.log_signal.emit(f"Server refused to replace {remote_path} by rename, deleting it first")
+            self.ftp.delete(remote_path)
+            self.ftp.rename(upload_path, remote_path)
+
+    def segment_digest(self, local_path, method):
+        # Ranges went out of order over several connections, the checksum command's algorithm needs one more read
+        hasher = upload_checksums.new_hasher(method)
+        with open(local_path, 'rb') as file:
+            upload_resume_store.hash_prefix(file, os.path.getsize(local_path), hasher)
+        return hasher.hexdigest()
+
+    def verify_upload(self, local_path, remote_path, method, local_digest):
+        # One checksum command when the server offers one, a SIZE comparison otherwise
+        if local_digest is not None:
+            try:
+                if upload_checksums.verify(self.ftp, remote_path, method, local_digest):
+                    return True
+                self.handler.log_signal.emit(f"Checksum mismatch after upload: {local_path} to {remote_path} ({method[1]})")
+                return False
+            except (ftplib.error_perm, ftplib.error_temp, ftplib.error_reply) as e:
+                # An answer that is not a digest of the expected algorithm says nothing about the upload itself
+                self.handler.log_signal.emit(f"Checksum verification of {remote_path} unavailable, comparing sizes: {e}")
+                if isinstance(e, ftplib.error_reply) or str(e)[:3] in ('500', '502', '504'):
+                    upload_checksums.disable(self.ftp.host)
+        local_size = os.path.getsize(local_path)
+        self.ftp.voidcmd('TYPE I')
+        remote_size = self.ftp.size(remote_path)
+        if local_size == remote_size:
+            return True
+        self.handler.log_signal.emit(f"Size mismatch after upload: {local_path} to {remote_path} (local: {local_size}, remote: {remote_size})")
+        return False
 
-    def move_remote_folder(self, src_path, dest_path):
+    def upload_segmented(self, local_path, remote_path):
+        streams = self.handler.segmented_streams
+        if streams < 2 or os.path.getsize(local_path) < segmented_upload_threshold:
+            return False
+        if not FTPManagerSegmentedUploader.supported(self.handler.ftp_host):
+            return False
         try:
-            relative_src = os.path.relpath(src_path, self.local_folder)
-            relative_dest = os.path.relpath(dest_path, self.local_folder)
-            remote_src = os.path.join(self.remote_folder, relative_src).replace('\\', '/')
-            remote_dest = os.path.join(self.remote_folder, relative_dest).replace('\\', '/')
-            self.ftp.rename(remote_src, remote_dest)
-            self.log_signal.emit(f"Moved remote folder: {remote_src} to {remote_dest}")
+            uploader = FTPManagerSegmentedUploader(self.handler.ftp_host, self.handler.ftp_user, self.handler.ftp_pass, self.handler.throttle, self.handler.stopping)
+            streams = uploader.upload_file(self.ftp, local_path, remote_path, streams)
+            if not streams:
+                return False
+            self.handler.log_signal.emit(f"Segmented upload of {local_path} finished over {streams} streams")
+            return True
+        except FTPManagerTransferStopped:
+            raise
         except Exception as e:
-            self.log_signal.emit(f"Error in move_remote_folder: {e}")
+            self.handler.log_signal.emit(f"Segmented upload of {local_path} failed, falling back to a single stream: {e}")
+            self.ensure_connection()
+            return False
 
-    def move_remote_file(self, src_path, dest_path):
+class FTPManagerSegmentedUploader:
+    """ Uploads one large file as concurrent REST+STOR ranges over several pooled connections """
+
+    capabilities = {}  # host -> whether REST+STOR writes in place without truncating
+    capabilities_lock = threading.Lock()
+
+    def __init__(self, host, username, password, throttle=None, stop_event=None):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.throttle = throttle
+        self.stop_event = stop_event
+
+    @classmethod
+    def supported(cls, host):
+        with cls.capabilities_lock:
+            return cls.capabilities.get(host, False)
+
+    @classmethod
+    def probe(cls, ftp, remote_folder, log_func=None):
+        # Servers that truncate at the REST offset or cannot write past the end would corrupt ranged uploads
+        with cls.capabilities_lock:
+            if ftp.host in cls.capabilities:
+                return cls.capabilities[ftp.host]
+        supported = False
+        probe_path = f"{remote_folder.rstrip('/')}/.ftpmanager_segment_probe"
         try:
-            relative_src = os.path.relpath(src_path, self.local_folder)
-            relative_dest = os.path.relpath(dest_path, self.local_folder)
-            remote_src = os.path.join(self.remote_folder, relative_src).replace('\\', '/')
-            remote_dest = os.path.join(self.remote_folder, relative_dest).replace('\\', '/')
-            self.ftp.rename(remote_src, remote_dest)
-            self.log_signal.emit(f"Moved remote file: {remote_src} to {remote_dest}")
+            if 'REST STREAM' in ftp.sendcmd('FEAT').upper():
+                ftp.storbinary(f'STOR {probe_path}', io.BytesIO(b'AAAABBBB'))
+                ftp.storbinary(f'STOR {probe_path}', io.BytesIO(b'XX'), rest=2)
+                # A server that truncates at the offset is left with 4 bytes here, the write past the end would hide that
+                ftp.voidcmd('TYPE I')
+                if ftp.size(probe_path) == 8:
+                    ftp.storbinary(f'STOR {probe_path}', io.BytesIO(b'DD'), rest=12)
+                    content = []
+                    ftp.retrbinary(f'RETR {probe_path}', content.append)
+                    content = b''.join(content)
+                    supported = len(content) == 14 and content[:8] == b'AAXXBBBB' and content[12:] == b'DD'
+        except ftplib.all_errors as e:
+            if log_func:
+                log_func(f"Segmented upload probe failed on {ftp.host}: {e}")
+        finally:
+            try:
+                ftp.delete(probe_path)
+            except ftplib.all_errors:
+                pass
+        with cls.capabilities_lock:
+            cls.capabilities[ftp.host] = supported
+        if log_func:
+            log_func(f"Segmented uploads {'supported' if supported else 'not supported'} by {ftp.host}")
+        return supported
+
+    def upload_file(self, ftp, local_path, remote_path, streams):
+        """ Returns the number of streams used, 0 when no pooled connection was free and nothing was sent """
+        # Only connections the pool has free right now join in, waiting for one would stall the first range's data connection
+        leases = ftp_connection_pool.acquire_spare(self.host, self.username, self.password, streams - 1)
+        if not leases:
+            return 0
+        size = os.path.getsize(local_path)
+        segment_size = -(-size // (len(leases) + 1))
+        ranges = [(offset, min(segment_size, size - offset)) for offset in range(0, size, segment_size)]
+        errors = []
+        threads = [threading.Thread(target=self.upload_range, args=(lease, local_path, remote_path, offset, length, errors), daemon=True) for lease, (offset, length) in zip(leases, ranges[1:])]
+        for lease in leases[len(threads):]:
+            lease.release()
+
+        # The first range creates (and truncates) the remote file, the others only start once it is open
+        try:
+            conn = upload_engine.open_data_connection(ftp, f'STOR {remote_path}')
+        except BaseException:
+            for lease in leases:
+                lease.release()
+            raise
+        for thread in threads:
+            thread.start()
+        try:
+            with open(local_path, 'rb') as file:
+                file.seek(ranges[0][0])
+                upload_engine.send(ftp, conn, file, ranges[0][1], throttle=self.throttle, stop_event=self.stop_event)
+            upload_engine.close_data_connection(conn)
+            ftp.voidresp()
+        except (FTPManagerTransferStopped,) + ftplib.all_errors as e:
+            errors.append(e)
+        finally:
+            conn.close()
+        for thread in threads:
+            thread.join()
+        if errors:
+            # A stop ends the other ranges with errors of their own, it is the one that counts
+            raise next((e for e in errors if isinstance(e, FTPManagerTransferStopped)), errors[0])
+
+        ftp.voidcmd('TYPE I')
+        remote_size = ftp.size(remote_path)
+        if remote_size != size:
+            raise ftplib.error_reply(f"Assembled size {remote_size} does not match local size {size}")
+        return len(ranges)
+
+    def upload_range(self, lease, local_path, remote_path, offset, length, errors):
+        try:
+            with lease:
+                conn = upload_engine.open_data_connection(lease.ftp, f'STOR {remote_path}', rest=offset)
+                with open(local_path, 'rb') as file:
+                    file.seek(offset)
+                    upload_engine.send(lease.ftp, conn, file, length, throttle=self.throttle, stop_event=self.stop_event)
+                upload_engine.close_data_connection(conn)
+                lease.ftp.voidresp()
         except Exception as e:
-            self.log_signal.emit(f"Error in move_remote_file: {e}")
+            errors.append(e)
+
+class FTPManagerPollingObserver(threading.Thread):
+    """ Watches a folder by diffing os.scandir snapshots, a drop-in for watchdog's Observer on network shares """
+
+    def __init__(self, min_interval=polling_min_interval, max_interval=polling_max_interval, full_sweep_interval=polling_full_sweep_interval,
+                 max_full_sweep_interval=polling_max_full_sweep_interval, hot_file_window=polling_hot_file_window):
+        super().__init__(name="PollingObserver", daemon=True)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.full_sweep_interval = full_sweep_interval
+        self.max_full_sweep_interval = max_full_sweep_interval
+        self.hot_file_window = hot_file_window
+        self.interval = min_interval
+        self.sweep_interval = full_sweep_interval
+        self.stop_event = threading.Event()
+        self.handler = None
+        self.path = None
+        self.directories = {}  # Folder -> (mtime_ns, {name: (is_dir, inode, size, mtime_ns)}, time.time_ns() when listed)
+        self.hot_files = {}  # Path -> time.monotonic() of its last change
+
+    def schedule(self, handler, path, recursive=True):
+        # The monitor schedules a single recursive watch
+        self.handler = handler
+        self.path = path
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        self.diff([self.path], True, None)
+        last_sweep = time.monotonic()
+        while not self.stop_event.wait(self.interval):
+            full = time.monotonic() - last_sweep >= self.sweep_interval
+            if full:
+                last_sweep = time.monotonic()
+            try:
+                changes = self.poll(full)
+            except Exception as e:
+                self.handler.log_signal.emit(f"Polling {self.path} failed: {e}")
+                changes = 0
+            # Fast while something is happening, backing off towards the slowest rate while the folder is idle
+            self.interval = self.min_interval if changes else min(self.max_interval, self.interval * 1.5)
+            # Full sweeps only catch in-place writes the folder mtimes hide, on an idle share they mostly cost a listing of everything
+            if changes:
+                self.sweep_interval = self.full_sweep_interval
+            elif full:
+                self.sweep_interval = min(self.max_full_sweep_interval, self.sweep_interval * 2)
+
+    def list_directory(self, directory):
+        entries = {}
+        with os.scandir(directory) as scan:
+            for entry in scan:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        entries[entry.name] = (True, entry.inode(), 0, 0)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        entries[entry.name] = (False, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    continue  # Vanished while listing
+        return entries
+
+    def diff(self, pending, full, changes):
+        """ Update the snapshot below the pending folders, collecting (created, deleted, modified) into changes unless it is None """
+        now = time.time_ns()
+        while pending and not self.stop_event.is_set():
+            directory = pending.pop()
+            state = self.directories.get(directory)
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue  # Gone since its parent was listed, the parent's next listing reports it
+            if state is not None and not full and state[0] == mtime_ns and state[2] - mtime_ns >= directory_mtime_granularity * 1000000000:
+                # No entry was added, removed or renamed here, only its subfolders need a look
+                pending.extend(os.path.join(directory, name) for name, entry in state[1].items() if entry[0])
+                continue
+            try:
+                entries = self.list_directory(directory)
+            except OSError:
+                continue
+            previous = state[1] if state is not None else {}
+            for name, entry in entries.items():
+                path = os.path.join(directory, name)
+                old = previous.get(name)
+                if changes is None:
+                    if entry[0]:
+                        pending.append(path)
+                elif old is None or old[0] != entry[0]:
+                    if old is not None:
+                        changes[1][path] = old
+                    changes[0][path] = entry
+                elif entry[0]:
+                    if old[1] != entry[1]:
+                        # Removed and created again under the same name
+                        changes[1][path] = old
+                        changes[0][path] = entry
+                    else:
+                        pending.append(path)
+                elif old[1:] != entry[1:]:
+                    changes[2].append(path)
+            if changes is not None:
+                for name in previous.keys() - entries.keys():
+                    changes[1][os.path.join(directory, name)] = previous[name]
+            self.directories[directory] = (mtime_ns, entries, now)
+
+    def forget(self, directory):
+        prefix = directory + os.sep
+        for known in [known for known in self.directories if known == directory or known.startswith(prefix)]:
+            del self.directories[known]
+
+    def check_hot_files(self, modified):
+        # Files written a moment ago are stat'ed on every scan, in-place writes leave their folder's mtime alone
+        now = time.monotonic()
+        for path, changed in list(self.hot_files.items()):
+            if now - changed > self.hot_file_window:
+                del self.hot_files[path]
+                continue
+            directory, name = os.path.split(path)
+            state = self.directories.get(directory)
+            old = state[1].get(name) if state is not None else None
+            if old is None or old[0]:
+                del self.hot_files[path]
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # The folder's listing reports it
+            entry = (False, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if entry != old:
+                state[1][name] = entry
+                modified.append(path)
+
+    def poll(self, full=False):
+        """ Compare the folder with the last snapshot and dispatch what changed, returns the number of events """
+        created, deleted, modified = {}, {}, []
+        self.check_hot_files(modified)
+        self.diff([self.path], full, (created, deleted, modified))
+
+        # A name that disappeared and one that appeared with the same inode, and for files the same size and mtime, were renamed.
+        # Shares that report no inode (0, as some SMB servers do) get a delete and a create instead
+        sources = {(entry[0], entry[1]): path for path, entry in deleted.items() if entry[1]}
+        moves = []
+        for path, entry in list(created.items()):
+            source = sources.pop((entry[0], entry[1]), None) if entry[1] else None
+            if source is None or (not entry[0] and deleted[source][2:] != entry[2:]):
+                continue
+            moves.append((source, path, entry[0]))
+            del created[path]
+            del deleted[source]
+        moves.sort(key=lambda move: (not move[2], move[0].count(os.sep)))
+        for source, path, is_dir in moves:
+            if is_dir:
+                for known in [known for known in self.directories if known == source or known.startswith(source + os.sep)]:
+                    self.directories[path + known[len(source):]] = self.directories.pop(known)
+        # Anything that changed inside a moved folder meanwhile is reported against its new place
+        moved_changes = ({}, {}, [])
+        self.diff([path for source, path, is_dir in moves if is_dir], full, moved_changes)
+        created.update(moved_changes[0])
+        deleted.update(moved_changes[1])
+        modified.extend(moved_changes[2])
+
+        for path, entry in deleted.items():
+            if entry[0]:
+                self.forget(path)
+        for path, entry in created.items():
+            if entry[0]:
+                # The handler uploads a new folder's contents itself, the snapshot only needs to know them
+                self.diff([path], True, None)
+
+        events = [DirMovedEvent(source, path) if is_dir else FileMovedEvent(source, path) for source, path, is_dir in moves]
+        events.extend(DirDeletedEvent(path) if entry[0] else FileDeletedEvent(path) for path, entry in sorted(deleted.items()))
+        events.extend(DirCreatedEvent(path) if entry[0] else FileCreatedEvent(path) for path, entry in sorted(created.items()))
+        events.extend(FileModifiedEvent(path) for path in modified)
+        now = time.monotonic()
+        for path in itertools.chain((path for path, entry in created.items() if not entry[0]), modified):
+            self.hot_files[path] = now
+        for event in events:
+            self.handler.dispatch(event)
+        return len(events)
 
 class FTPManagerObserverThread(QtCore.QThread):
     log_signal = QtCore.pyqtSignal(str)
     tray_notification_signal = QtCore.pyqtSignal(str, str)  # Title, Message
+    reconcile_progress_signal = QtCore.pyqtSignal(str, int, int)  # Phase, done, total
+    reconcile_finished_signal = QtCore.pyqtSignal(int)  # Uploads queued
 
-    def __init__(self, local_path, remote_path, ftp, log_func, quickconnect_in_use=False, notifications_enabled=True, notification_filter=None, username=None, password=None, parent=None):
+    def __init__(self, local_path, remote_path, host, log_func, quickconnect_in_use=False, notifications_enabled=True, notification_filter=None, username=None, password=None, settings=None, parent=None):
         super().__init__(parent)
         self.local_path = local_path
         self.remote_path = remote_path
-        self.ftp = ftp
+        self.host = host
         self.log_func = log_func
         self.quickconnect_in_use = quickconnect_in_use
         self.notifications_enabled = notifications_enabled
         self.notification_filter = notification_filter
         self.username = username
         self.password = password
+        self.settings = settings or {}
         self.observer = None
+        self.event_handler = None
+        self.stop_event = threading.Event()
 
     def run(self):
         try:
             if self.log_func:
                 self.log_func(f"Starting observer for local path: {self.local_path}, remote path: {self.remote_path}")
-            event_handler = FTPManagerFTPEventHandlerWrapper(
-                self.ftp, self.remote_path, self.local_path, self.quickconnect_in_use, 
+            self.event_handler = FTPManagerFTPEventHandlerWrapper(
+                self.host, self.remote_path, self.local_path, self.quickconnect_in_use, 
                 self.notifications_enabled, self.notification_filter, self.log_func,
-                self.username, self.password
+                self.username, self.password, self.settings
             )
-            event_handler.log_signal.connect(self.log_func)
-            event_handler.tray_notification_signal.connect(self.tray_notification_signal.emit)
-            self.observer = Observer()
-            self.observer.schedule(event_handler, self.local_path, recursive=True)
+            self.event_handler.log_signal.connect(self.log_func)
+            self.event_handler.tray_notification_signal.connect(self.tray_notification_signal.emit)
+            if self.settings.get('watch_mode') == 'polling':
+                # Network shares deliver no inotify events for changes made by other machines
+                self.observer = FTPManagerPollingObserver()
+            else:
+                self.observer = Observer()
+            self.observer.schedule(self.event_handler, self.local_path, recursive=True)
             self.observer.start()
             if self.log_func:
                 self.log_func("Observer started successfully")
-            self.exec_()  # Keep the thread running
+            if self.settings.get('reconcile_on_start', 1):
+                # Events arriving meanwhile are coalesced and applied once the scan has queued what changed while we were away
+                self.reconcile()
+            if not self.stop_event.is_set():
+                self.exec_()  # Keep the thread running until stop() ends the event loop
         except Exception as e:
             if self.log_func:
                 self.log_func(f"Error starting observer: {e}")
             if debug_mode:
                 print(f"Debug: Error starting observer: {e}")
-            self.quit()
+        finally:
+            if self.observer and self.stop_event.is_set():
+                # stop() may have come before the observer was started
+                self.observer.stop()
+            # The handler's timers and connection belong to this thread, so does its teardown
+            if self.event_handler:
+                try:
+                    self.event_handler.close()
+                except Exception as e:
+                    self.log_func(f"Error closing the monitor of {self.local_path}: {e}")
+
+    def reconcile(self):
+        reconciler = FTPManagerReconciler(
+            self.host, self.username, self.password, self.remote_path, self.local_path,
+            self.event_handler.upload_connections, self.log_func, self.reconcile_progress_signal.emit,
+            self.event_handler.file_index, self.event_handler.directory_index
+        )
+        queued = 0
+        try:
+            queued = reconciler.run(self.event_handler.queue_upload, self.stop_event)
+        except ftplib.all_errors as e:
+            self.log_func(f"Reconciliation of {self.local_path} with {self.remote_path} failed: {e}")
+        finally:
+            self.reconcile_finished_signal.emit(queued)
 
     def stop(self):
+        self.stop_event.set()
         try:
             if self.observer:
                 if self.log_func:
                     self.log_func("Stopping observer")
                 self.observer.stop()
                 self.observer.join()
+            if self.event_handler:
+                # Queued to the observer thread, where it ends the event loop and run() closes the handler
+                self.event_handler.shutdown_signal.emit()
             self.quit()
+            self.wait()
             if self.log_func:
                 self.log_func("Observer stopped successfully")
         except Exception as e:
@@ -2240,117 +5879,47 @@ class FTPManagerObserverThread(QtCore.QThread):
             if debug_mode:
                 print(f"Debug: Error emitting log signal: {e}")
 
-class FTPManagerFTPUploadThread(QtCore.QThread):
+class FTPManagerMirrorThread(QtCore.QThread):
     log_signal = QtCore.pyqtSignal(str)
-    upload_complete_signal = QtCore.pyqtSignal(str, str, bool)
-
-    def __init__(self, ftp, local_path, remote_path, log_func, upload_complete_callback, parent=None):
-        super().__init__(parent)
-        self.ftp = ftp
-        self.local_path = local_path
-        self.remote_path = remote_path
-        self.log_func = log_func
-        self.upload_complete_callback = upload_complete_callback
-        self.log_signal.connect(self.log_func)
-
-    def run(self):
-        try:
-            self.log_signal.emit(f"Starting upload: Local Path: {self.local_path}, Remote Path: {self.remote_path}")
-            with open(self.local_path, 'rb') as file:
-                self.ftp.storbinary(f'STOR {self.remote_path}', file)
-            self.log_signal.emit(f"Upload successful: {self.local_path} to {self.remote_path}")
-            self.upload_complete_signal.emit(self.local_path, self.remote_path, True)
-        except FileNotFoundError:
-            self.log_signal.emit(f"Error: Local file not found: {self.local_path}")
-            self.upload_complete_signal.emit(self.local_path, self.remote_path, False)
-        except ftplib.error_perm as e:
-            self.log_signal.emit(f"FTP permission error during upload: {e}")
-            self.upload_complete_signal.emit(self.local_path, self.remote_path, False)
-        except ftplib.error_temp as e:
-            self.log_signal.emit(f"Temporary FTP error during upload: {e}. Retrying...")
-            self.retry_upload()
-        except Exception as e:
-            self.log_signal.emit(f"Unexpected error during upload: {e}")
-            self.upload_complete_signal.emit(self.local_path, self.remote_path, False)
-        finally:
-            self.quit()
-
-    def retry_upload(self):
-        retries = 3
-        for attempt in range(retries):
-            try:
-                with open(self.local_path, 'rb') as file:
-                    self.ftp.storbinary(f'STOR {self.remote_path}', file)
-                self.log_signal.emit(f"Retry upload successful: {self.local_path} to {self.remote_path}")
-                self.upload_complete_signal.emit(self.local_path, self.remote_path, True)
-                return
-            except ftplib.error_temp as e:
-                self.log_signal.emit(f"Retry {attempt + 1} failed: {e}")
-            except Exception as e:
-                self.log_signal.emit(f"Unexpected error during retry {attempt + 1}: {e}")
-        self.log_signal.emit(f"Failed to upload {self.local_path} to {self.remote_path} after {retries} attempts.")
-        self.upload_complete_signal.emit(self.local_path, self.remote_path, False)
 
-class FTPManagerFTPDeleteThread(QtCore.QThread):
-    log_signal = QtCore.pyqtSignal(str)  # Define the log_signal
-
-    def __init__(self, ftp, remote_path, log_func, parent=None):
+    def __init__(self, local_path, remote_path, host, username, password, settings=None, parent=None):
         super().__init__(parent)
-        self.ftp = ftp
-        self.remote_path = remote_path
-        self.log_func = log_func
-        self.log_signal.connect(self.log_func)  # Connect signal to the logging function
+        settings = settings or {}
+        self.interval = max(10, settings.get('mirror_interval') or mirror_interval)
+        self.stop_event = threading.Event()
+        self.quick_connect_id = settings.get('id')
+        transfer_tuner.seed(host, settings.get('tuned_blocksize'), settings.get('tuned_sndbuf'))
+        self.mirror = FTPManagerMirror(
+            host, username, password, remote_path, local_path,
+            settings.get('upload_connections') or default_upload_connections, self.log_signal.emit,
+            bandwidth_limiter.throttle(host, self.quick_connect_id), settings.get('segmented_streams') or 0
+        )
 
     def run(self):
-        try:
-            self.log_signal.emit(f"Starting delete: Remote Path: {self.remote_path}")
-            self.ftp.delete(self.remote_path)
-            self.log_signal.emit(f"Delete successful: {self.remote_path}")
-        except ftplib.error_perm as e:
-            self.log_signal.emit(f"FTP permission error during delete: {e}")
-        except ftplib.error_temp as e:
-            self.log_signal.emit(f"Temporary FTP error during delete: {e}. Retrying...")
-            self.retry_delete()
-        except Exception as e:
-            self.log_signal.emit(f"Unexpected error during delete: {e}")
-        finally:
-            self.quit()
-
-    def retry_delete(self):
-        retries = 3
-        for attempt in range(retries):
+        self.log_signal.emit(f"Mirroring {self.mirror.host}:{self.mirror.remote_folder} into {self.mirror.local_folder} every {self.interval} seconds")
+        while not self.stop_event.is_set():
             try:
-                self.ftp.delete(self.remote_path)
-                self.log_signal.emit(f"Retry delete successful: {self.remote_path}")
-                return
-            except ftplib.error_temp as e:
-                self.log_signal.emit(f"Retry {attempt + 1} failed: {e}")
-            except Exception as e:
-                self.log_signal.emit(f"Unexpected error during retry {attempt + 1}: {e}")
-        self.log_signal.emit(f"Failed to delete {self.remote_path} after {retries} attempts.")
-
-class FTPManagerFTPConnectThread(QtCore.QThread):
-    connection_successful = QtCore.pyqtSignal(object)  # Emit FTP object on success
-    connection_failed = QtCore.pyqtSignal(str)
-    log_signal = QtCore.pyqtSignal(str)
-
-    def __init__(self, host, username, password, remote_folder, parent=None):
-        super().__init__(parent)
-        self.host = host
-        self.username = username
-        self.password = password
-        self.remote_folder = remote_folder
+                self.mirror.run_pass(self.stop_event)
+            except FTPManagerTransferStopped:
+                break
+            except ftplib.all_errors as e:
+                self.log_signal.emit(f"Mirror scan of {self.mirror.remote_folder} failed: {e}")
+            finally:
+                transfer_tuner.save(self.mirror.host, self.quick_connect_id, self.log_signal.emit)
+            self.stop_event.wait(self.interval)
+        self.log_signal.emit("Mirror stopped")
 
-    def run(self):
-        try:
-            self.log_signal.emit(f"Connecting to FTP server: {self.host}")
-            ftp = ftplib.FTP(self.host)
-            ftp.login(self.username, self.password)
-            self.log_signal.emit(f"Connected to FTP server: {self.host}")
-            self.connection_successful.emit(ftp)  # Pass FTP object on success
-        except Exception as e:
-            self.log_signal.emit(f"Failed to connect to FTP server: {e}")
-            self.connection_failed.emit(str(e))
+    def stop(self):
+        # Returns at once, the walk and the downloads in flight check the event and the thread ends on its own
+        self.stop_event.set()
+        # The application owns the thread until it has finished, the tab drops its reference right away,
+        # and quitting the application waits for it
+        application = QtCore.QCoreApplication.instance()
+        self.setParent(application)
+        application.aboutToQuit.connect(self.wait)
+        self.finished.connect(self.deleteLater)
+        if self.isFinished():
+            self.deleteLater()
 
 class FTPManagerCredentialsManager(QtWidgets.QWidget):
     def __init__(self, parent=None):
@@ -2754,15 +6323,17 @@ class FTPManagerAddFolderDialog(QtWidgets.QDialog):
             if password is None:
                 print("Error: No password found for the given credentials.")
                 return
-            try:
-                self.ftp = ftplib.FTP(host)
-                self.ftp.login(username, password)
-                self.populate_remote_folder_tree()
-            except Exception as e:
-                print(f'Error connecting to FTP server: {e}')
+            async_ftp_engine.list_tree(host, username, password, '', on_finished=self.on_remote_tree_listed)
         else:
             print("Error: No host selected.")
 
+    def on_remote_tree_listed(self, job_id, success, result):
+        if not success:
+            print(f'Error connecting to FTP server: {result}')
+            return
+        self.remote_folder_tree.clear()
+        self.add_remote_folder_items(self.remote_folder_tree, result or [])
+
     def select_local_folder(self):
         folder = QtWidgets.QFileDialog.getExistingDirectory(self, 'Select Local Folder')
         if folder:
@@ -2776,29 +6347,11 @@ class FTPManagerAddFolderDialog(QtWidgets.QDialog):
         conn.close()
         return row[0] if row else None
 
-    def populate_remote_folder_tree(self):
-        self.remote_folder_tree.clear()
-        self.add_remote_folder_items('', self.remote_folder_tree)
-
-    def add_remote_folder_items(self, path, parent_item):
-        try:
-            items = self.ftp.nlst(path)
-            for item in items:
-                item_path = os.path.join(path, item)
-                tree_item = QtWidgets.QTreeWidgetItem(parent_item, [item])
-                if self.is_remote_directory(item_path):
-                    self.add_remote_folder_items(item_path, tree_item)
-        except Exception as e:
-            print(f'Error listing remote folders: {e}')
-
-    def is_remote_directory(self, path):
-        current = self.ftp.pwd()
-        try:
-            self.ftp.cwd(path)
-            self.ftp.cwd(current)
-            return True
-        except ftplib.error_perm:
-            return False
+    def add_remote_folder_items(self, parent_item, entries):
+        for name, children in entries:
+            tree_item = QtWidgets.QTreeWidgetItem(parent_item, [name])
+            if children:
+                self.add_remote_folder_items(tree_item, children)
 
     @staticmethod
     def get_folder_info(parent=None, name=None, remote_path=None, local_path=None):
@@ -2905,17 +6458,14 @@ class FTPManagerEditFolderDialog(QtWidgets.QDialog):
             print("Error: No password found for the given credentials.")
             return
 
-        self.ftp_thread = FTPManagerFTPConnectThread(host, username, password, None, self)
-        self.ftp_thread.connection_successful.connect(self.on_ftp_connection_successful)
-        self.ftp_thread.connection_failed.connect(self.on_ftp_connection_failed)
-        self.ftp_thread.start()
-
-    def on_ftp_connection_successful(self, ftp):
-        self.ftp = ftp
-        self.populate_remote_folder_tree()
+        async_ftp_engine.list_tree(host, username, password, '', directories_only=True, on_finished=self.on_remote_tree_listed)
 
-    def on_ftp_connection_failed(self, error):
-        print(f'Error connecting to FTP server: {error}')
+    def on_remote_tree_listed(self, job_id, success, result):
+        if not success:
+            print(f'Error connecting to FTP server: {result}')
+            return
+        self.remote_folder_tree.clear()
+        self.add_remote_folder_items(self.remote_folder_tree, result or [])
 
     def select_local_folder(self):
         folder = QtWidgets.QFileDialog.getExistingDirectory(self, 'Select Local Folder')
@@ -2940,32 +6490,11 @@ class FTPManagerEditFolderDialog(QtWidgets.QDialog):
         conn.close()
         return row[0] if row else None
 
-    def populate_remote_folder_tree(self):
-        self.remote_folder_tree.clear()
-        self.add_remote_folder_items('', self.remote_folder_tree)
-
-    def add_remote_folder_items(self, path, parent_item):
-        try:
-            items = [item for item in self.ftp.nlst(path) if item not in ['.', '..']]
-            for item in items:
-                item_path = os.path.join(path, item)
-                if self.is_remote_directory(item_path):
-                    tree_item = QtWidgets.QTreeWidgetItem(parent_item, [item])
-                    self.add_remote_folder_items(item_path, tree_item)
-                else:
-                    # Skip files
-                    pass
-        except Exception as e:
-            print(f'Error listing remote folders: {e}')
-
-    def is_remote_directory(self, path):
-        current = self.ftp.pwd()
-        try:
-            self.ftp.cwd(path)
-            self.ftp.cwd(current)
-            return True
-        except ftplib.error_perm:
-            return False
+    def add_remote_folder_items(self, parent_item, entries):
+        for name, children in entries:
+            tree_item = QtWidgets.QTreeWidgetItem(parent_item, [name])
+            if children:
+                self.add_remote_folder_items(tree_item, children)
 
     def get_data(self):
         return self.name_input.text(), self.remote_path_input.text(), self.local_path_input.text()
@@ -2992,10 +6521,13 @@ class FTPManagerQuickConnectManager(QtWidgets.QWidget):
         self.edit_button.clicked.connect(self.edit_selected_quick_connects)
         self.add_button = QtWidgets.QPushButton('Add Quick Connect')
         self.add_button.clicked.connect(self.add_quick_connect)
+        self.settings_button = QtWidgets.QPushButton('Transfer Settings')
+        self.settings_button.clicked.connect(self.edit_selected_settings)
 
         button_layout = QtWidgets.QHBoxLayout()
         button_layout.addWidget(self.add_button)
         button_layout.addWidget(self.edit_button)
+        button_layout.addWidget(self.settings_button)
         button_layout.addWidget(self.delete_button)
 
         layout = QtWidgets.QVBoxLayout()
@@ -3088,6 +6620,15 @@ class FTPManagerQuickConnectManager(QtWidgets.QWidget):
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Error", f"Unexpected error: {e}")
 
+    def edit_selected_settings(self):
+        selected_items = self.table.selectionModel().selectedRows()
+        if not selected_items:
+            QtWidgets.QMessageBox.warning(self, 'No selection', 'No quick connects selected for editing.')
+            return
+        for item in selected_items:
+            quick_connect_id = self.table.item(item.row(), 0).data(QtCore.Qt.UserRole)
+            FTPManagerQuickConnectSettingsDialog(quick_connect_id, self).exec_()
+
     def add_quick_connect(self):
         try:
             dialog = FTPManagerEditQuickConnectDialog(self)
@@ -3221,6 +6762,188 @@ class FTPManagerEditQuickConnectDialog(QtWidgets.QDialog):
     def get_data(self):
         return [(self.host_input.text(), self.username_input.text(), self.password_input.text(), self.local_folder_input.text(), self.remote_folder_input.text()) for widget in self.quick_connect_widgets]
     
+class FTPManagerQuickConnectSettingsDialog(QtWidgets.QDialog):
+    """ Edits the transfer settings stored alongside one quick connect, they apply the next time it is started """
+
+    columns = ('sync_direction', 'mirror_interval', 'upload_connections', 'segmented_streams', 'atomic_uploads', 'settle_interval', 'reconcile_on_start', 'watch_mode')
+
+    def __init__(self, quick_connect_id, parent=None):
+        super().__init__(parent)
+        self.setWindowIcon(QtGui.QIcon(resource_path("app_icon.ico")))
+        self.setWindowTitle('Quick Connect Settings')
+        self.quick_connect_id = quick_connect_id
+
+        self.sync_direction_input = QtWidgets.QComboBox(self)
+        self.sync_direction_input.addItems(['upload', 'download'])
+        self.mirror_interval_input = QtWidgets.QSpinBox(self)
+        self.mirror_interval_input.setRange(10, 86400)
+        self.mirror_interval_input.setSuffix(' s')
+        self.upload_connections_input = QtWidgets.QSpinBox(self)
+        self.upload_connections_input.setRange(1, max_connections_per_host)
+        self.segmented_streams_input = QtWidgets.QSpinBox(self)
+        self.segmented_streams_input.setRange(0, max_connections_per_host)
+        self.segmented_streams_input.setSpecialValueText('Off')
+        self.atomic_uploads_input = QtWidgets.QCheckBox('Upload to a hidden name and rename it into place', self)
+        self.settle_interval_input = QtWidgets.QDoubleSpinBox(self)
+        self.settle_interval_input.setRange(0, 3600)
+        self.settle_interval_input.setDecimals(1)
+        self.settle_interval_input.setSuffix(' s')
+        self.reconcile_on_start_input = QtWidgets.QCheckBox('Upload what changed while the folder was not monitored', self)
+        self.watch_mode_input = QtWidgets.QComboBox(self)
+        self.watch_mode_input.addItems(['events', 'polling'])
+        self.watch_mode_input.setToolTip('Polling finds changes on network shares that send no file system events')
+
+        form = QtWidgets.QFormLayout()
+        form.addRow('Sync direction:', self.sync_direction_input)
+        form.addRow('Mirror interval:', self.mirror_interval_input)
+        form.addRow('Connections:', self.upload_connections_input)
+        form.addRow('Streams per large file:', self.segmented_streams_input)
+        form.addRow('', self.atomic_uploads_input)
+        form.addRow('Settle interval:', self.settle_interval_input)
+        form.addRow('', self.reconcile_on_start_input)
+        form.addRow('Watch mode:', self.watch_mode_input)
+
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Save | QtWidgets.QDialogButtonBox.Cancel, self)
+        buttons.accepted.connect(self.save)
+        buttons.rejected.connect(self.reject)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(form)
+        layout.addWidget(buttons)
+        self.load()
+
+    def load(self):
+        try:
+            conn = sqlite3.connect(master_db_file)
+            c = conn.cursor()
+            c.execute(f"SELECT {', '.join(self.columns)} FROM quick_connects WHERE id=?", (self.quick_connect_id,))
+            row = c.fetchone()
+            conn.close()
+        except sqlite3.Error as e:
+            QtWidgets.QMessageBox.critical(self, "Database Error", f"Failed to load quick connect settings: {e}")
+            return
+        if row is None:
+            return
+        sync_direction, interval, connections, streams, atomic_uploads, settle_interval, reconcile_on_start, watch_mode = row
+        self.sync_direction_input.setCurrentText(sync_direction)
+        self.mirror_interval_input.setValue(int(interval))
+        self.upload_connections_input.setValue(int(connections))
+        self.segmented_streams_input.setValue(int(streams))
+        self.atomic_uploads_input.setChecked(bool(atomic_uploads))
+        self.settle_interval_input.setValue(float(settle_interval))
+        self.reconcile_on_start_input.setChecked(bool(reconcile_on_start))
+        self.watch_mode_input.setCurrentText(watch_mode)
+
+    def save(self):
+        values = (
+            self.sync_direction_input.currentText(),
+            self.mirror_interval_input.value(),
+            self.upload_connections_input.value(),
+            self.segmented_streams_input.value(),
+            int(self.atomic_uploads_input.isChecked()),
+            self.settle_interval_input.value(),
+            int(self.reconcile_on_start_input.isChecked()),
+            self.watch_mode_input.currentText(),
+        )
+        try:
+            conn = sqlite3.connect(master_db_file)
+            c = conn.cursor()
+            c.execute(f"UPDATE quick_connects SET {', '.join(f'{column}=?' for column in self.columns)} WHERE id=?", values + (self.quick_connect_id,))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            QtWidgets.QMessageBox.critical(self, "Database Error", f"Failed to save quick connect settings: {e}")
+            return
+        self.accept()
+
+class FTPManagerBandwidthManager(QtWidgets.QWidget):
+    def __init__(self, parent=None):
+        super().__init__(None)
+        self.setWindowTitle('Bandwidth Limits')
+        self.setWindowIcon(QtGui.QIcon(resource_path("app_icon.ico")))
+        self.setGeometry(100, 100, 600, 400)
+        self.setWindowFlags(QtCore.Qt.Window)  # Ensure it shows in the taskbar
+
+        self.help_label = QtWidgets.QLabel(
+            "Scope is global, host (target = host name) or session (target = quick connect ID).\n"
+            "Schedule example: 08:00-18:00=2M; *=0 (bytes per second, 0 = unlimited)."
+        )
+
+        self.table = QtWidgets.QTableWidget(self)
+        self.table.setColumnCount(3)
+        self.table.setHorizontalHeaderLabels(['Scope', 'Target', 'Schedule'])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setSelectionBehavior(QtWidgets.QTableView.SelectRows)
+
+        self.load_limits()
+
+        self.add_button = QtWidgets.QPushButton('Add Limit')
+        self.add_button.clicked.connect(self.add_limit)
+        self.delete_button = QtWidgets.QPushButton('Delete Selected')
+        self.delete_button.clicked.connect(self.delete_selected_limits)
+        self.save_button = QtWidgets.QPushButton('Save')
+        self.save_button.clicked.connect(self.save_limits)
+
+        button_layout = QtWidgets.QHBoxLayout()
+        button_layout.addWidget(self.add_button)
+        button_layout.addWidget(self.delete_button)
+        button_layout.addWidget(self.save_button)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addWidget(self.help_label)
+        layout.addWidget(self.table)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def load_limits(self):
+        try:
+            conn = sqlite3.connect(master_db_file)
+            c = conn.cursor()
+            c.execute('SELECT scope, target, schedule FROM bandwidth_limits ORDER BY id')
+            rows = c.fetchall()
+            conn.close()
+            self.table.setRowCount(len(rows))
+            for i, row in enumerate(rows):
+                for column, value in enumerate(row):
+                    self.table.setItem(i, column, QtWidgets.QTableWidgetItem(str(value)))
+        except sqlite3.Error as e:
+            QtWidgets.QMessageBox.critical(self, "Error", f"SQLite error: {e.args[0]}")
+
+    def add_limit(self):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        self.table.setItem(row, 0, QtWidgets.QTableWidgetItem('global'))
+        self.table.setItem(row, 1, QtWidgets.QTableWidgetItem(''))
+        self.table.setItem(row, 2, QtWidgets.QTableWidgetItem('*=0'))
+
+    def delete_selected_limits(self):
+        for index in sorted((index.row() for index in self.table.selectionModel().selectedRows()), reverse=True):
+            self.table.removeRow(index)
+
+    def save_limits(self):
+        rows = []
+        for row in range(self.table.rowCount()):
+            scope, target, schedule = [(self.table.item(row, column).text().strip() if self.table.item(row, column) else '') for column in range(3)]
+            if scope not in ('global', 'host', 'session'):
+                QtWidgets.QMessageBox.warning(self, "Invalid Limit", f"Row {row + 1}: scope must be global, host or session.")
+                return
+            try:
+                FTPManagerBandwidthSchedule(schedule)
+            except ValueError:
+                QtWidgets.QMessageBox.warning(self, "Invalid Limit", f"Row {row + 1}: cannot parse schedule '{schedule}'.")
+                return
+            rows.append((scope, target, schedule))
+        try:
+            conn = sqlite3.connect(master_db_file)
+            c = conn.cursor()
+            c.execute('DELETE FROM bandwidth_limits')
+            c.executemany('INSERT INTO bandwidth_limits (scope, target, schedule) VALUES (?, ?, ?)', rows)
+            conn.commit()
+            conn.close()
+            bandwidth_limiter.reload()
+        except sqlite3.Error as e:
+            QtWidgets.QMessageBox.critical(self, "Error", f"SQLite error: {e.args[0]}")
+
 class FTPManagerFTPManagerWindow(QtWidgets.QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -3228,6 +6951,10 @@ class FTPManagerFTPManagerWindow(QtWidgets.QWidget):
         self.setWindowTitle('FTP Manager')
         self.setGeometry(100, 100, 800, 600)
         self.setWindowFlags(QtCore.Qt.Window)
+        self.ftp = None
+        self.ftp_lease = None
+        self.upload_jobs = {}  # Transfer executor job id -> (bytes done, bytes total)
+        self.remote_directories = FTPManagerRemoteDirectoryCache()
         self.initUI()
 
     def initUI(self):
@@ -3257,6 +6984,12 @@ class FTPManagerFTPManagerWindow(QtWidgets.QWidget):
         self.progress_bar = QtWidgets.QProgressBar(self)
         self.progress_bar.setVisible(False)
 
+        # Progress bar for uploads running in the background
+        self.upload_progress_bar = QtWidgets.QProgressBar(self)
+        self.upload_progress_bar.setRange(0, 1000)
+        self.upload_progress_bar.setFormat('Uploading %p%')
+        self.upload_progress_bar.setVisible(False)
+
         # Adding widgets to the layout
         layout.addWidget(self.session_dropdown)
         layout.addWidget(self.select_folders_button)
@@ -3264,6 +6997,7 @@ class FTPManagerFTPManagerWindow(QtWidgets.QWidget):
         layout.addWidget(self.drag_drop_area)
         layout.addWidget(self.remote_file_tree)
         layout.addWidget(self.progress_bar)
+        layout.addWidget(self.upload_progress_bar)
 
         self.setLayout(layout)
 
@@ -3287,21 +7021,44 @@ class FTPManagerFTPManagerWindow(QtWidgets.QWidget):
     def connect_to_session(self, session_name):
         try:
             self.log(f"Attempting to connect to session: {session_name}")
-            self.ftp = self.parent().get_ftp_connection(session_name)
-            if self.ftp is None:
-                raise ValueError(f"No FTP connection found for session: {session_name}")
-            self.log(f"FTP connection obtained for session: {session_name}")
-            self.log(f"Connected to session: {session_name}")
-            self.start_folder_loading_thread()
-        except ValueError as ve:
-            error_message = str(ve)
-            self.log(error_message)
-            QtWidgets.QMessageBox.critical(self, "Connection Error", error_message)
+            self.release_session_connection()
+            # Tabs and the log are looked up here, only the blocking login runs on the executor
+            credentials = self.parent().get_session_credentials(session_name)
+            if credentials is None:
+                self.on_session_connected(session_name, True, None)
+                return
+            transfer_executor.submit(
+                ftp_connection_pool.acquire, *credentials,
+                on_finished=lambda job_id, success, result: self.on_session_connected(session_name, success, result)
+            )
         except Exception as e:
             error_message = f"Error connecting to session {session_name}: {e}"
             self.log(error_message)
             QtWidgets.QMessageBox.critical(self, "Connection Error", error_message)
 
+    def on_session_connected(self, session_name, success, result):
+        if not success or result is None:
+            error_message = f"No FTP connection found for session: {session_name}" if success else f"Error connecting to session {session_name}: {result}"
+            self.log(error_message)
+            QtWidgets.QMessageBox.critical(self, "Connection Error", error_message)
+            return
+        self.release_session_connection()
+        self.ftp_lease = result
+        self.ftp = self.ftp_lease.ftp
+        self.remote_directories = FTPManagerRemoteDirectoryCache()
+        self.log(f"Connected to session: {session_name}")
+        self.start_folder_loading_thread()
+
+    def release_session_connection(self):
+        if self.ftp_lease:
+            self.ftp_lease.release()
+        self.ftp_lease = None
+        self.ftp = None
+
+    def closeEvent(self, event):
+        self.release_session_connection()
+        super().closeEvent(event)
+
     def log(self, message):
         print(message)
 
@@ -3318,53 +7075,87 @@ class FTPManagerFTPManagerWindow(QtWidgets.QWidget):
             self.upload_files(files)
 
     def upload_folders(self, folders):
-        try:
-            for folder in folders:
-                self.log(f"Uploading folder: {folder}")
-                self.ftp_upload_folder(folder)
-            self.log("Folders uploaded successfully")
-        except Exception as e:
-            self.log(f"Error uploading folders: {e}")
+        self.start_upload([], folders)
 
     def upload_files(self, files):
-        try:
-            for file in files:
-                self.log(f"Uploading file: {file}")
-                self.ftp_upload_file(file)
-            self.log("Files uploaded successfully")
-        except Exception as e:
-            self.log(f"Error uploading files: {e}")
-
-    def ftp_upload_folder(self, folder):
-        try:
-            for root, dirs, files in os.walk(folder):
-                for directory in dirs:
-                    local_dir = os.path.join(root, directory)
-                    remote_dir = os.path.relpath(local_dir, folder)
-                    self.ftp.mkd(remote_dir)
-                    self.log(f"Created remote directory: {remote_dir}")
-                for file in files:
-                    local_file = os.path.join(root, file)
-                    remote_file = os.path.relpath(local_file, folder)
-                    with open(local_file, 'rb') as f:
-                        self.ftp.storbinary(f'STOR {remote_file}', f)
-                    self.log(f"Uploaded file: {local_file} to {remote_file}")
-        except Exception as e:
-            self.log(f"Error uploading folder {folder}: {e}")
+        self.start_upload(files, [])
 
-    def ftp_upload_file(self, file):
-        try:
-            remote_file = os.path.basename(file)
-            with open(file, 'rb') as f:
-                self.ftp.storbinary(f'STOR {remote_file}', f)
-            self.log(f"Uploaded file: {file} to {remote_file}")
-        except Exception as e:
-            self.log(f"Error uploading file {file}: {e}")
+    def upload_paths(self, paths):
+        self.start_upload([path for path in paths if not os.path.isdir(path)], [path for path in paths if os.path.isdir(path)])
+
+    def start_upload(self, files, folders):
+        if self.ftp_lease is None:
+            QtWidgets.QMessageBox.warning(self, "Not Connected", "Select a connected session before uploading.")
+            return
+        lease = self.ftp_lease
+        job_id = transfer_executor.submit(
+            self.upload_job, lease.host, lease.username, lease.password, files, folders, self.remote_directories,
+            on_progress=self.on_upload_progress, on_finished=self.on_upload_finished
+        )
+        self.upload_jobs[job_id] = (0, 0)
+        self.upload_progress_bar.setVisible(True)
+        self.log(f"Queued upload of {len(files)} files and {len(folders)} folders")
+
+    def upload_job(self, host, username, password, files, folders, remote_directories, progress):
+        """ Runs on a transfer executor thread and must not touch any widget """
+        uploads = [(file, os.path.basename(file)) for file in files]
+        directories = []
+        for folder in folders:
+            for root, dirs, names in os.walk(folder):
+                directories.extend(os.path.relpath(os.path.join(root, directory), folder).replace('\\', '/') for directory in dirs)
+                uploads.extend((os.path.join(root, name), os.path.relpath(os.path.join(root, name), folder).replace('\\', '/')) for name in names)
+        total = sum(os.path.getsize(local_file) for local_file, _ in uploads)
+        done = [0, 0.0]  # Bytes sent, time of the last progress report
+
+        def sent(nbytes):
+            done[0] += nbytes
+            now = time.monotonic()
+            if now - done[1] >= 0.1:
+                done[1] = now
+                progress(done[0], total)
+
+        uploaded = 0
+        with ftp_connection_pool.acquire(host, username, password) as lease:
+            # Walk order is top-down, so each new directory costs a single MKD
+            for remote_dir in directories:
+                remote_directories.ensure(lease.ftp, remote_dir, self.log)
+            for local_file, remote_file in uploads:
+                remote_directories.ensure(lease.ftp, posixpath.dirname(remote_file), self.log)
+                with open(local_file, 'rb') as f:
+                    upload_engine.store(lease.ftp, f'STOR {remote_file}', f, callback=sent)
+                uploaded += 1
+                self.log(f"Uploaded file: {local_file} to {remote_file}")
+        progress(total, total)
+        return uploaded
+
+    def on_upload_progress(self, job_id, done, total):
+        self.upload_jobs[job_id] = (done, total)
+        self.update_upload_progress()
+
+    def on_upload_finished(self, job_id, success, result):
+        self.upload_jobs.pop(job_id, None)
+        if success:
+            self.log(f"Uploaded {result} files successfully")
+        else:
+            self.log(f"Error uploading: {result}")
+            QtWidgets.QMessageBox.warning(self, "Upload Error", f"Upload failed: {result}")
+        self.update_upload_progress()
+        if not self.upload_jobs and self.ftp_lease is not None:
+            self.start_folder_loading_thread()
+
+    def update_upload_progress(self):
+        if not self.upload_jobs:
+            self.upload_progress_bar.setVisible(False)
+            return
+        done = sum(job_done for job_done, _ in self.upload_jobs.values())
+        total = sum(job_total for _, job_total in self.upload_jobs.values())
+        # Per mille, byte counts of large uploads do not fit the progress bar's int range
+        self.upload_progress_bar.setValue(int(1000 * done / total) if total else 0)
 
     def start_folder_loading_thread(self):
         try:
             self.folder_loading_thread = QtCore.QThread()
-            self.folder_loading_worker = FolderLoadingWorker(self.ftp, self.remote_file_tree)
+            self.folder_loading_worker = FolderLoadingWorker(self.ftp_lease.host, self.ftp_lease.username, self.ftp_lease.password, self.remote_file_tree)
             self.folder_loading_worker.moveToThread(self.folder_loading_thread)
             self.folder_loading_thread.started.connect(self.folder_loading_worker.run)
             self.folder_loading_worker.finished.connect(self.folder_loading_thread.quit)
@@ -3421,7 +7212,7 @@ class FTPManagerDropArea(QtWidgets.QWidget):
     def dropEvent(self, event):
         urls = event.mimeData().urls()
         paths = [url.toLocalFile() for url in urls]
-        self.parent().upload_files(paths)
+        self.parent().upload_paths(paths)
 
 class FTPManagerTutorialWindow(QWidget):
     def __init__(self, parent=None):
@@ -3838,6 +7629,8 @@ class FTPManagerTutorialWindow(QWidget):
         """
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--benchmark-upload':
+        sys.exit(run_upload_benchmark(sys.argv[2:]))
     app = QtWidgets.QApplication(sys.argv)
     mainWin = FTPManagerFTPApp()
     mainWin.show()